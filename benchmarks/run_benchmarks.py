@@ -0,0 +1,218 @@
+"""Times every pipeline stage on a synthetic corpus and records throughput and peak RSS per commit.
+
+Usage:
+    python benchmarks/run_benchmarks.py --articles-per-house 2000 --clips 200
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent / 'src'))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+import synthetic_corpus  # noqa: E402
+from local_server import serve_directory  # noqa: E402
+
+STAGES = ['extract', 'extract_pipeline', 'compile', 'duration', 'gender', 'download', 'tables']
+TABLE_ROWS = 100_000
+DEFAULT_RESULTS_PATH = BENCHMARKS_DIR / 'results.jsonl'
+
+
+def bench_extract(work_dir, workers):
+    from extract_news_audio import get_news_with_audio, read_json_file
+
+    articles = 0
+    for news_house in synthetic_corpus.NEWS_HOUSES:
+        for dump_path in sorted((work_dir / 'data' / news_house / 'news_dataset').iterdir()):
+            news_data = read_json_file(dump_path)
+            get_news_with_audio(news_data, news_house)
+            articles += len(news_data)
+    return {'items': articles}
+
+
+def bench_extract_pipeline(work_dir, workers):
+    from extract_news_audio import run_pipeline
+
+    summary = run_pipeline(synthetic_corpus.NEWS_HOUSES, str(work_dir / 'data'), workers)
+    return {'items': sum(counts['read'] for counts in summary.values())}
+
+
+def bench_compile(work_dir, workers):
+    from compile_news_metadata import compile_news_metadata
+
+    return {'items': len(compile_news_metadata(str(work_dir / 'data'), synthetic_corpus.NEWS_HOUSES))}
+
+
+def bench_duration(work_dir, workers):
+    from get_audio_duration import probe_durations
+
+    paths = sorted(str(path) for path in (work_dir / 'mp3').iterdir())
+    probe_durations(paths, None, workers)
+    return {'items': len(paths)}
+
+
+def bench_gender(work_dir, workers):
+    from identify_gender import classify_genders
+
+    paths = sorted(str(path) for path in (work_dir / 'wav').iterdir())
+    classify_genders(paths, workers)
+    return {'items': len(paths)}
+
+
+def bench_download(work_dir, workers):
+    import pandas as pd
+    from audio_download import download_rfa_audio
+    from http_download import create_session
+
+    clips = sorted((work_dir / 'mp3').iterdir())
+    output_dir = work_dir / 'downloaded'
+    with serve_directory(work_dir / 'mp3') as base_url:
+        df = pd.DataFrame({
+            'ID': [clip.stem for clip in clips],
+            'Audio URL': [f'{base_url}/{clip.name}' for clip in clips],
+            'News Channel': 'RFA',
+        })
+        # The local server is not throttled, so the per-host pace is lifted to measure raw throughput
+        download_rfa_audio(df, str(output_dir), create_session(workers), max_workers=workers, rate_per_host=1000.0)
+    downloaded = sum(path.stat().st_size for path in output_dir.glob('*.mp3'))
+    return {'items': len(clips), 'bytes': downloaded}
+
+
+def bench_tables(work_dir, workers):
+    """Times the column-wise table transforms of every stage on a large table without any audio."""
+    import pandas as pd
+    from audio_download import download_rfa_audio
+    from compile_news_metadata import save_news_metadata
+    from get_audio_duration import add_audio_duration
+    from identify_gender import label_speaker_gender
+
+    df = pd.read_csv(work_dir / 'news_table.csv', dtype=str, keep_default_na=False)
+    download_rfa_audio(df, str(work_dir / 'table_audio'), None, manifest_path=str(work_dir / 'table_manifest.jsonl'))
+    df = add_audio_duration(df, str(work_dir / 'table_data'))
+    label_speaker_gender(df, str(work_dir / 'table_data'), workers)
+    save_news_metadata(df.iloc[::-1].to_dict('records'), str(work_dir / 'news_table_sorted.csv'))
+    return {'items': len(df)}
+
+
+def run_stage(stage, work_dir, workers, results):
+    """Runs one stage in this (child) process and reports its timing and peak RSS."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        result = globals()[f'bench_{stage}'](Path(work_dir), workers)
+        result['seconds'] = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result['peak_worker_rss_mb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    results.put(result)
+
+
+def measure(stage, work_dir, workers):
+    """Runs a stage in a fresh process so that its peak RSS is not inflated by earlier stages."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run_stage, args=(stage, str(work_dir), workers, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARKS_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_previous_results(results_path):
+    """Returns the latest recorded result per (stage, scale)."""
+    previous = {}
+    if results_path.exists():
+        with open(results_path, 'r', encoding='utf-8') as results_file:
+            for line in results_file:
+                record = json.loads(line)
+                previous[(record['stage'], record['scale'])] = record
+    return previous
+
+
+def build_corpus(work_dir, args):
+    synthetic_corpus.write_news_dumps(work_dir / 'data', args.articles_per_house)
+    synthetic_corpus.write_audio_clips(work_dir / 'mp3', args.clips, args.clip_seconds, 'mp3')
+    synthetic_corpus.write_audio_clips(work_dir / 'wav', max(1, args.clips // 10), args.clip_seconds, 'wav')
+    synthetic_corpus.write_news_table(work_dir / 'news_table.csv', work_dir / 'table_manifest.jsonl', TABLE_ROWS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on a synthetic corpus.')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES, help='Stages to run.')
+    parser.add_argument('--articles-per-house', type=int, default=1000, help='Articles per news house.')
+    parser.add_argument('--clips', type=int, default=100, help='Number of MP3 clips (WAV clips are a tenth).')
+    parser.add_argument('--clip-seconds', type=float, default=5.0, help='Duration of each clip.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker count passed to the stages.')
+    parser.add_argument('--results', type=Path, default=DEFAULT_RESULTS_PATH, help='JSON-lines results file.')
+    parser.add_argument('--fail-on-regression', type=float, default=None, metavar='PCT',
+                        help='Exit non-zero if a stage is more than PCT percent slower than the last record.')
+    parser.add_argument('--work-dir', type=Path, default=None, help='Keep the corpus in this directory.')
+    args = parser.parse_args()
+
+    scale = f'{args.articles_per_house}x{args.clips}x{args.clip_seconds:g}s'
+    commit = current_commit()
+    previous = load_previous_results(args.results)
+    regressions = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or Path(tmp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        build_corpus(work_dir, args)
+
+        # extract_pipeline writes the article directories the compile stage reads
+        stages = [stage for stage in STAGES if stage in args.stages]
+        if 'compile' in stages and 'extract_pipeline' not in stages:
+            measure('extract_pipeline', work_dir, args.workers)
+
+        for stage in stages:
+            result = measure(stage, work_dir, args.workers)
+            record = {
+                'commit': commit,
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'stage': stage,
+                'scale': scale,
+                'workers': args.workers,
+                'items_per_second': result['items'] / result['seconds'] if result['seconds'] else 0.0,
+                **result,
+            }
+
+            change = ''
+            last = previous.get((stage, scale))
+            if last and last['items_per_second']:
+                delta = (record['items_per_second'] / last['items_per_second'] - 1) * 100
+                change = f' ({delta:+.1f}% vs {last["commit"]})'
+                if args.fail_on_regression is not None and -delta > args.fail_on_regression:
+                    regressions.append(stage)
+            print(
+                f'{stage:<17} {record["items"]:>8} items {record["seconds"]:>8.2f}s '
+                f'{record["items_per_second"]:>10.1f}/s  peak RSS {record["peak_rss_mb"]:.0f} MB{change}'
+            )
+
+            with open(args.results, 'a', encoding='utf-8') as results_file:
+                results_file.write(json.dumps(record) + '\n')
+
+    if regressions:
+        print(f'Throughput regressed by more than {args.fail_on_regression}% in: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
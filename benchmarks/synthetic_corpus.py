@@ -0,0 +1,176 @@
+import json
+import math
+import random
+import struct
+import wave
+from pathlib import Path
+
+NEWS_HOUSES = ['VOA', 'VOT', 'RFA']
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo: 417-byte frames of 1152 samples
+MP3_FRAME_HEADER = b'\xff\xfb\x90\x00'
+MP3_FRAME_LENGTH = 417
+MP3_FRAME_SECONDS = 1152 / 44100
+
+TIBETAN_WORDS = ['བོད་', 'རྒྱལ་ཁབ་', 'གསར་འགྱུར་', 'མི་མང་', 'སྐད་ཆ་', 'ལོ་', 'ཟླ་བ་', 'ཚོགས་འདུ་']
+
+
+def make_article(rng, article_id, news_house, with_audio, base_url, lines_per_article=20):
+    """Builds one article in the layout of the scraped news dumps.
+
+    Args:
+        rng (random.Random): Random generator.
+        article_id (str): ID of the article.
+        news_house (str): News house of the article.
+        with_audio (bool): Whether the article links an audio file.
+        base_url (str): URL prefix of the audio files.
+        lines_per_article (int): Number of body text lines.
+
+    Returns:
+        dict: Article information.
+    """
+    text = [' '.join(rng.choices(TIBETAN_WORDS, k=12)) for _ in range(lines_per_article)]
+    if rng.random() < 0.5:
+        text.insert(1, f"གསར་འགོད་པ། {rng.choice(TIBETAN_WORDS)}")
+    return {
+        'data': {
+            'title': ' '.join(rng.choices(TIBETAN_WORDS, k=5)),
+            'body': {
+                'Audio': f'{base_url}/{news_house}/{article_id}.mp3' if with_audio else '',
+                'Text': text,
+            },
+            'meta_data': {
+                'speaker': rng.choice(['Unknown', 'བཀྲ་ཤིས་', 'སྒྲོལ་མ་']),
+                'Date': f'20{rng.randint(10, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+                'Author': 'Synthetic',
+                'Tags': rng.choices(TIBETAN_WORDS, k=2),
+                'URL': f'https://example.org/{news_house}/{article_id}',
+            },
+        },
+        'Message': 'Success',
+        'Response': 200,
+    }
+
+
+def write_news_dumps(data_dir, articles_per_house=1000, articles_per_file=250, audio_ratio=0.5,
+                     base_url='http://127.0.0.1:8000', seed=0):
+    """Writes `<news_house>/news_dataset/*.json` dumps for every news house.
+
+    Args:
+        data_dir (Path): Root data directory.
+        articles_per_house (int): Number of articles per news house.
+        articles_per_file (int): Number of articles per dump file.
+        audio_ratio (float): Fraction of the articles that link an audio file.
+        base_url (str): URL prefix of the audio files.
+        seed (int): Random seed.
+
+    Returns:
+        int: Number of articles written.
+    """
+    rng = random.Random(seed)
+    for news_house in NEWS_HOUSES:
+        dataset_dir = Path(data_dir) / news_house / 'news_dataset'
+        dataset_dir.mkdir(parents=True, exist_ok=True)
+        for file_index, start in enumerate(range(0, articles_per_house, articles_per_file)):
+            dump = {
+                f'{news_house}{article_index:07d}': make_article(
+                    rng, f'{news_house}{article_index:07d}', news_house, rng.random() < audio_ratio, base_url
+                )
+                for article_index in range(start, min(start + articles_per_file, articles_per_house))
+            }
+            with open(dataset_dir / f'news_{file_index:04d}.json', 'w', encoding='utf-8') as dump_file:
+                json.dump(dump, dump_file, ensure_ascii=False)
+    return articles_per_house * len(NEWS_HOUSES)
+
+
+def write_news_table(table_path, manifest_path, rows=100_000, seed=0):
+    """Writes a compiled news table and a download manifest in which every RFA audio is done.
+
+    The table has the columns of `compile_news_metadata` for `rows` articles spread over
+    the news houses; the manifest lets the download stage plan the whole table without
+    fetching anything.
+
+    Args:
+        table_path (Path): Path of the CSV table.
+        manifest_path (Path): Path of the JSON-lines download manifest.
+        rows (int): Number of articles.
+        seed (int): Random seed.
+    """
+    rng = random.Random(seed)
+    with open(table_path, 'w', encoding='utf-8') as table_file, \
+            open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+        table_file.write('ID,Audio URL,Audio Text,Speaker Name,Speaker Gender,News Channel,Publishing Year\n')
+        for index in range(rows):
+            news_house = NEWS_HOUSES[index % len(NEWS_HOUSES)]
+            article_id = f'{news_house}{index:07d}'
+            audio_url = f'https://example.org/{news_house}/{article_id}.mp3'
+            text = ' '.join(rng.choices(TIBETAN_WORDS, k=12))
+            year = f'20{rng.randint(10, 24)}-01-01'
+            table_file.write(f'{article_id},{audio_url},{text},Unknown,,{news_house},{year}\n')
+            if news_house == 'RFA':
+                manifest_file.write(json.dumps({'id': article_id, 'url': audio_url, 'status': 'done'}) + '\n')
+
+
+def write_mp3_clip(path, seconds, with_xing=True):
+    """Writes a silent MP3 made of empty MPEG frames.
+
+    Args:
+        path (Path): Output path.
+        seconds (float): Duration of the clip.
+        with_xing (bool): Prefix an Xing header with the frame count.
+    """
+    frame_count = max(1, int(seconds / MP3_FRAME_SECONDS))
+    empty_frame = MP3_FRAME_HEADER + b'\x00' * (MP3_FRAME_LENGTH - 4)
+    with open(path, 'wb') as mp3_file:
+        if with_xing:
+            xing = MP3_FRAME_HEADER + b'\x00' * 32 + b'Xing' + struct.pack('>II', 1, frame_count)
+            mp3_file.write(xing + b'\x00' * (MP3_FRAME_LENGTH - len(xing)))
+        mp3_file.write(empty_frame * frame_count)
+
+
+def write_wav_clip(path, seconds, pitch_hz, sample_rate=16000):
+    """Writes a mono 16-bit WAV of a voiced-like tone with harmonics at `pitch_hz`.
+
+    Args:
+        path (Path): Output path.
+        seconds (float): Duration of the clip.
+        pitch_hz (float): Fundamental frequency.
+        sample_rate (int): Sample rate.
+    """
+    samples = bytearray()
+    for n in range(int(seconds * sample_rate)):
+        t = n / sample_rate
+        value = sum(math.sin(2 * math.pi * pitch_hz * harmonic * t) / harmonic for harmonic in (1, 2, 3))
+        samples += struct.pack('<h', int(value * 8000))
+    with wave.open(str(path), 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(bytes(samples))
+
+
+def write_audio_clips(audio_dir, count, seconds=5.0, file_format='mp3', seed=0):
+    """Writes `count` clips named `clip_<n>` with alternating low and high pitch.
+
+    Args:
+        audio_dir (Path): Output directory.
+        count (int): Number of clips.
+        seconds (float): Duration of each clip.
+        file_format (str): 'mp3' (silent frames) or 'wav' (tones).
+        seed (int): Random seed.
+
+    Returns:
+        list: Paths of the clips.
+    """
+    rng = random.Random(seed)
+    audio_dir = Path(audio_dir)
+    audio_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = audio_dir / f'clip_{index:06d}.{file_format}'
+        if file_format == 'wav':
+            write_wav_clip(path, seconds, rng.choice([110.0, 220.0]))
+        else:
+            write_mp3_clip(path, seconds, with_xing=index % 2 == 0)
+        paths.append(str(path))
+    return paths
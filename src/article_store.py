@@ -0,0 +1,166 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+NEWS_HOUSES = ['VOA', 'VOT', 'RFA']
+STORAGE_BACKENDS = ['files', 'sqlite']
+
+
+def article_store_path(data_root_dir, news_house):
+    """Returns the path of a news house's packed article store."""
+    return os.path.join(data_root_dir, news_house, 'articles.sqlite')
+
+
+def open_article_store(store_path):
+    """Opens (and creates if needed) the packed article store of one news house.
+
+    The store replaces the per-article directories of `news_dataset_with_audio` with
+    one SQLite file holding the audio URL, text and metadata of every article. WAL
+    mode lets the extraction workers append batches while the file is being read.
+
+    Args:
+        store_path (str): Path of the SQLite database.
+
+    Returns:
+        sqlite3.Connection: Connection to the store.
+    """
+    os.makedirs(os.path.dirname(store_path) or '.', exist_ok=True)
+    connection = sqlite3.connect(store_path, timeout=60)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS articles ('
+        'article_id TEXT PRIMARY KEY, audio_url TEXT, body_text TEXT, metadata TEXT)'
+    )
+    return connection
+
+
+def save_articles(connection, articles):
+    """Writes a batch of articles in one transaction, replacing articles with the same ID.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store.
+        articles (list): (article_id, audio_url, body_text, metadata_json) tuples.
+    """
+    with connection:
+        connection.executemany('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?)', articles)
+
+
+def get_article(connection, article_id):
+    """Looks up one article by ID.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store.
+        article_id (str): ID of the article.
+
+    Returns:
+        dict: Audio URL, body text and metadata of the article, None if it is not stored.
+    """
+    row = connection.execute(
+        'SELECT audio_url, body_text, metadata FROM articles WHERE article_id = ?', (article_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {'audio_url': row[0], 'body_text': row[1], 'metadata': json.loads(row[2])}
+
+
+def iter_articles(connection):
+    """Yields every stored article in insertion order, reading the store sequentially.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store.
+
+    Yields:
+        tuple: Article ID, audio URL, body text and metadata dict.
+    """
+    for article_id, audio_url, body_text, metadata in connection.execute(
+        'SELECT article_id, audio_url, body_text, metadata FROM articles ORDER BY rowid'
+    ):
+        yield article_id, audio_url, body_text, json.loads(metadata)
+
+
+def read_article_dir(article_dir):
+    """Reads the files `extract_news_audio` saved for one article.
+
+    Args:
+        article_dir (str): Directory holding `<ID>_audio_url.txt`, `news_text.txt` and `metadata.json`.
+
+    Returns:
+        tuple: Article ID, audio URL, body text and metadata JSON, ready for `save_articles`.
+    """
+    article_id = os.path.basename(article_dir)
+    contents = {}
+    for file_name in [f'{article_id}_audio_url.txt', 'news_text.txt', 'metadata.json']:
+        file_path = os.path.join(article_dir, file_name)
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as file:
+                contents[file_name] = file.read()
+    return (
+        article_id,
+        contents.get(f'{article_id}_audio_url.txt', '').strip(),
+        contents.get('news_text.txt', ''),
+        contents.get('metadata.json', '{}'),
+    )
+
+
+def migrate_article_dirs(articles_dir, store_path, batch_size=1000, remove_dirs=False):
+    """Packs an existing tree of article directories into an article store.
+
+    Args:
+        articles_dir (str): The `news_dataset_with_audio` directory of a news house.
+        store_path (str): Path of the article store to write.
+        batch_size (int): Number of articles written per transaction.
+        remove_dirs (bool): Delete the article directories once they are stored.
+
+    Returns:
+        int: Number of articles migrated.
+    """
+    connection = open_article_store(store_path)
+    migrated = 0
+    with os.scandir(articles_dir) as entries:
+        article_dirs = sorted(entry.path for entry in entries if entry.is_dir())
+    for start in range(0, len(article_dirs), batch_size):
+        batch = [read_article_dir(article_dir) for article_dir in article_dirs[start:start + batch_size]]
+        save_articles(connection, batch)
+        migrated += len(batch)
+    connection.close()
+
+    if remove_dirs:
+        for article_dir in article_dirs:
+            shutil.rmtree(article_dir)
+    metrics.increment('articles_migrated', migrated)
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack the per-article directories into one article store '
+                                                 'per news house.')
+    parser.add_argument('--data-dir', default='./data', help='Root data directory.')
+    parser.add_argument('--news-houses', nargs='+', default=NEWS_HOUSES, choices=NEWS_HOUSES,
+                        help='News houses to migrate.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Articles written per transaction.')
+    parser.add_argument('--remove-dirs', action='store_true',
+                        help='Delete the article directories after they are stored.')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args)
+
+    for news_house in args.news_houses:
+        articles_dir = os.path.join(args.data_dir, news_house, 'news_dataset_with_audio')
+        if not os.path.isdir(articles_dir):
+            logger.warning("Directory %s not found.", articles_dir)
+            continue
+        store_path = article_store_path(args.data_dir, news_house)
+        migrated = migrate_article_dirs(articles_dir, store_path, args.batch_size, args.remove_dirs)
+        logger.info("%s: %d articles packed into %s", news_house, migrated, store_path)
+    metrics.finish(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,248 @@
+import hashlib
+import json
+import logging
 import os
-import requests
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def download_rfa_audio(df, output_dir, session):
+import pandas as pd
+
+import metrics
+from audio_store import (
+    add_clip,
+    add_reference,
+    clip_path,
+    dedup_stats,
+    incoming_path,
+    link_clip,
+    lookup_url,
+    open_audio_store,
+)
+from rate_limit import AdaptiveConcurrency, HostRateLimiter, fetch_with_retry, is_retryable
+
+logger = logging.getLogger(__name__)
+
+RFA_HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "accept-encoding": "gzip, deflate, br, zstd",
+    "accept-language": "en-US,en;q=0.9,en-IN;q=0.8",
+    "cache-control": "max-age=0",
+    "priority": "u=0, i",
+    "sec-ch-ua": "\"Microsoft Edge\";v=\"129\", \"Not=A?Brand\";v=\"8\", \"Chromium\";v=\"129\"",
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": "\"Windows\"",
+    "sec-fetch-dest": "document",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-site": "none",
+    "sec-fetch-user": "?1",
+    "upgrade-insecure-requests": "1",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0"
+}
+
+# A browser session cookie for rfa.org can be supplied when the site starts rejecting plain requests
+if os.environ.get('RFA_COOKIE'):
+    RFA_HEADERS['cookie'] = os.environ['RFA_COOKIE']
+
+
+def load_manifest(manifest_path):
+    """Loads the download manifest, keeping the latest entry for every audio ID.
+
+    Args:
+        manifest_path (str): Path to the JSON-lines manifest file.
+
+    Returns:
+        dict: Manifest entries keyed by audio ID.
+    """
+    manifest: dict = {}
+    if not os.path.exists(manifest_path):
+        return manifest
+    with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        for line in manifest_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A run killed mid-write can leave a truncated last line
+            manifest[entry['id']] = entry
+    return manifest
+
+
+def append_manifest_entry(manifest_file, entry):
+    """Appends one entry to the open manifest file.
+
+    Args:
+        manifest_file (file): Manifest file opened for appending.
+        entry (dict): Manifest entry with at least an 'id' key.
+    """
+    manifest_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    manifest_file.flush()
+
+
+def download_rfa_audio(df, output_dir, session, max_workers=8, manifest_path=None, store_dir=None,
+                       rate_per_host=4.0, retries=5, retry_cooldown=60.0):
     """Downloads RFA audio files based on the provided DataFrame.
 
+    Up to `max_workers` files are transferred at once over the shared session. Requests
+    are paced per host and retried with backoff on throttling and server errors, and the
+    number in flight shrinks while the server pushes back. URLs that still fail are
+    queued and tried once more after `retry_cooldown` seconds. Every finished or failed
+    transfer is recorded in a JSON-lines manifest so that a rerun skips IDs that are
+    already done and retries the failed ones. IDs whose URL failed permanently (a dead
+    link or another error `is_retryable` rejects) are recorded as dead and are not tried
+    again until their URL changes.
+
+    With `store_dir`, clips go to a content-addressed audio store: a URL that is
+    already stored is not fetched again, a download whose content is already stored is
+    discarded, and `<output_dir>/<ID>.mp3` becomes a link to the unique clip.
+
     Args:
         df (pd.DataFrame): DataFrame containing audio metadata.
         output_dir (str): Directory where audio files will be saved.
-        session (requests.Session): Session object for making requests.
-    """
-    headers = {
-        "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-        "accept-encoding": "gzip, deflate, br, zstd",
-        "accept-language": "en-US,en;q=0.9,en-IN;q=0.8",
-        "cache-control": "max-age=0",
-        "cookie": "AMCVS_518ABC7455E462B97F000101%40AdobeOrg=1; s_cc=true; utag_main=v_id:019169eade56002296e6ea4a443c0507d001b075008f7$_sn:11$_se:5$_ss:0$_st:1727788387180$vapi_domain:rfa.org$ses_id:1727793787%3Bexp-session$_pn:5%3Bexp-session; AMCV_518ABC7455E462B97F000101%40AdobeOrg=1176715910%7CMCIDTS%7C19997%7CMCMID%7C92058839809215745258174654077801968713%7CMCAID%7CNONE%7CMCOPTOUT-1727793787s%7CNONE%7CvVersion%7C5.4.0; s_sq=%5B%5BB%5D%5D",
-        "priority": "u=0, i",
-        "sec-ch-ua": "\"Microsoft Edge\";v=\"129\", \"Not=A?Brand\";v=\"8\", \"Chromium\";v=\"129\"",
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": "\"Windows\"",
-        "sec-fetch-dest": "document",
-        "sec-fetch-mode": "navigate",
-        "sec-fetch-site": "none",
-        "sec-fetch-user": "?1",
-        "upgrade-insecure-requests": "1",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0"
-    }
+        session (requests.Session): Session object for making requests, ideally from
+            `http_download.create_session` with a pool at least `max_workers` wide.
+        max_workers (int): Number of concurrent downloads.
+        manifest_path (str): Path of the manifest file, defaults to `manifest.jsonl` in `output_dir`.
+        store_dir (str): Directory of the content-addressed audio store, None to store per article.
+        rate_per_host (float): Requests per second allowed to each host.
+        retries (int): Attempts per URL and pass; URLs still failing with a retryable error are
+            queued for the next pass.
+        retry_cooldown (float): Seconds to wait before the retry pass over the queued URLs.
 
+    Returns:
+        dict: Number of downloads per status ('done', 'failed', 'dead', 'skipped'), the number
+            of articles served by an existing clip, and the store statistics when a store is used.
+    """
     os.makedirs(output_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir, 'manifest.jsonl')
+    manifest = load_manifest(manifest_path)
+    store = open_audio_store(store_dir) if store_dir else None
 
-    for index, row in df.iterrows():
-        audio_url = row['Audio URL']
-        audio_id = row['ID']
-        news_channel = row['News Channel']
+    summary = {'done': 0, 'failed': 0, 'dead': 0, 'skipped': 0, 'deduplicated': 0}
+    rfa = df.loc[df['News Channel'] == 'RFA']
+    audio_ids = rfa['ID'].astype(str)
+    audio_urls = rfa['Audio URL']
+    valid = audio_urls.notna() & ~audio_urls.isin(['', 'URL not found'])
+    for audio_id in audio_ids[~valid]:
+        logger.warning("No valid audio URL found for RFA ID: %s", audio_id)
 
-        if news_channel == 'RFA':
-            try:
-                if audio_url and audio_url != 'URL not found':
-                    # Define the audio file path
-                    audio_file_path = os.path.join(output_dir, f'{audio_id}.mp3')
-                    
-                    # Check if the audio file already exists
-                    if not os.path.exists(audio_file_path):
-                        response = session.get(audio_url, headers=headers, stream=True)
-                        response.raise_for_status()  # Check for HTTP errors
-
-                        # Save the audio file
-                        with open(audio_file_path, 'wb') as audio_file:
-                            for chunk in response.iter_content(chunk_size=1024):
-                                if chunk:
-                                    audio_file.write(chunk)
-
-                        print(f"Downloaded RFA audio: {audio_id}.mp3")
-                    else:
-                        print(f"Audio file {audio_id}.mp3 already exists. Skipping download.")
+    done_urls = pd.Series(
+        {audio_id: entry['url'] for audio_id, entry in manifest.items() if entry['status'] == 'done'}, dtype=object
+    )
+    dead_urls = pd.Series(
+        {audio_id: entry['url'] for audio_id, entry in manifest.items() if entry['status'] == 'dead'}, dtype=object
+    )
+    already_done = valid & (audio_ids.map(done_urls) == audio_urls)
+    already_dead = valid & (audio_ids.map(dead_urls) == audio_urls)
+    summary['skipped'] = int(already_done.sum())
+    summary['dead'] = int(already_dead.sum())
+
+    # Articles to fetch, grouped by URL so that a republished bulletin is downloaded once
+    jobs: dict = {}
+    pending = valid & ~already_done & ~already_dead
+    audio_file_paths = os.path.join(output_dir, '') + audio_ids[pending] + '.mp3'
+    for audio_url, audio_id, audio_file_path in zip(audio_urls[pending], audio_ids[pending], audio_file_paths):
+        jobs.setdefault(audio_url, []).append((audio_id, audio_file_path))
+
+    logger.info("%d RFA audio files already downloaded, %d URLs to fetch.", summary['skipped'], len(jobs))
+
+    rate_limiter = HostRateLimiter(rate_per_host, burst=max_workers)
+    concurrency = AdaptiveConcurrency(max_workers)
+
+    def fetch(audio_url, download_path):
+        try:
+            result = fetch_with_retry(
+                session, audio_url, download_path, rate_limiter, concurrency,
+                headers=RFA_HEADERS, retries=retries, skip_existing=True,
+            )
+            return result, None
+        except Exception as e:
+            return None, e
+
+    with open(manifest_path, 'a', encoding='utf-8') as manifest_file:
+
+        def record(audio_url, result, error, deduplicated=False):
+            for position, (audio_id, audio_file_path) in enumerate(jobs[audio_url]):
+                entry = {'id': audio_id, 'url': audio_url, 'path': audio_file_path}
+                if error:
+                    entry.update(status='failed' if is_retryable(error) else 'dead', error=str(error))
+                    logger.warning("Failed to access or download RFA URL %s: %s", audio_url, error)
                 else:
-                    print(f"No valid audio URL found for RFA ID: {audio_id}")
-            except Exception as e:
-                print(f"Failed to access or download RFA URL {audio_url}: {e}")
+                    entry.update(status='done', bytes=result['bytes'], sha256=result['sha256'])
+                    if store:
+                        try:
+                            link_clip(store_dir, result['sha256'], audio_file_path)
+                            add_reference(store, 'RFA', audio_id, result['sha256'], audio_url)
+                        except OSError as e:
+                            entry.update(status='failed', error=str(e))
+                            logger.warning("Failed to link RFA audio %s from the store: %s", audio_id, e)
+                    if entry['status'] == 'done':
+                        if deduplicated or position > 0:
+                            summary['deduplicated'] += 1
+                        logger.debug("Downloaded RFA audio: %s.mp3", audio_id)
+                append_manifest_entry(manifest_file, entry)
+                summary[entry['status']] += 1
+                metrics.increment(f"rfa_downloads_{entry['status']}")
+
+        to_fetch = {}
+        for audio_url, articles in jobs.items():
+            known_sha256 = lookup_url(store, audio_url) if store else None
+            # A clip missing from disk counts as not stored and is fetched again
+            if known_sha256 and os.path.exists(clip_path(store_dir, known_sha256)):
+                size = os.path.getsize(clip_path(store_dir, known_sha256))
+                record(audio_url, {'bytes': size, 'sha256': known_sha256}, None, deduplicated=True)
+            elif store:
+                to_fetch[audio_url] = incoming_path(store_dir, hashlib.sha1(audio_url.encode('utf-8')).hexdigest())
+            else:
+                to_fetch[audio_url] = articles[0][1]
+
+        def store_result(audio_url, result):
+            deduplicated = False
+            if store:
+                deduplicated = not add_clip(store, store_dir, to_fetch[audio_url], result['sha256'], audio_url)
+            else:
+                # Without a store, every other article sharing the URL gets its own copy
+                for audio_id, audio_file_path in jobs[audio_url][1:]:
+                    shutil.copyfile(to_fetch[audio_url], audio_file_path)
+            record(audio_url, result, None, deduplicated)
+
+        def run_pass(urls):
+            failed = {}
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(fetch, audio_url, to_fetch[audio_url]): audio_url for audio_url in urls}
+                for future in as_completed(futures):
+                    audio_url = futures[future]
+                    result, error = future.result()
+                    if error:
+                        failed[audio_url] = error
+                    else:
+                        store_result(audio_url, result)
+            return failed
+
+        with metrics.profile_stage('download'):
+            failed = run_pass(list(to_fetch))
+            # Dead links and other permanent errors are not worth the cooldown
+            retry_queue = [audio_url for audio_url, error in failed.items() if is_retryable(error)]
+            if retry_queue:
+                logger.info(
+                    "%d RFA URLs failed, retrying them in %.0f seconds.", len(retry_queue), retry_cooldown
+                )
+                time.sleep(retry_cooldown)
+                for audio_url in retry_queue:
+                    del failed[audio_url]
+                failed.update(run_pass(retry_queue))
+        for audio_url, error in failed.items():
+            record(audio_url, None, error)
+
+    if store:
+        stats = dedup_stats(store)
+        store.close()
+        summary.update(stats)
+        logger.info(
+            "Audio store holds %d unique clips for %d articles, saving %.1f MB.",
+            stats['unique_clips'], stats['articles'], stats['saved_bytes'] / 1e6,
+        )
+    return summary
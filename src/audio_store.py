@@ -0,0 +1,152 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+
+
+def open_audio_store(store_dir):
+    """Opens (and creates if needed) a content-addressed audio store.
+
+    Clips are kept once under `objects/<sha256[:2]>/<sha256>.mp3`. The SQLite index maps
+    every source URL and every article to the clip it resolved to.
+
+    Args:
+        store_dir (str): Directory of the store.
+
+    Returns:
+        sqlite3.Connection: Connection to the store index.
+    """
+    os.makedirs(os.path.join(store_dir, 'objects'), exist_ok=True)
+    os.makedirs(os.path.join(store_dir, 'incoming'), exist_ok=True)
+    connection = sqlite3.connect(os.path.join(store_dir, 'audio_store.sqlite'))
+    connection.executescript(
+        'CREATE TABLE IF NOT EXISTS clips (sha256 TEXT PRIMARY KEY, size INTEGER);'
+        'CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT);'
+        'CREATE TABLE IF NOT EXISTS refs ('
+        'channel TEXT, article_id TEXT, sha256 TEXT, url TEXT, PRIMARY KEY (channel, article_id));'
+    )
+    return connection
+
+
+def clip_path(store_dir, sha256):
+    """Returns the path of a clip in the store.
+
+    Args:
+        store_dir (str): Directory of the store.
+        sha256 (str): Checksum of the clip.
+
+    Returns:
+        str: Path of the clip.
+    """
+    return os.path.join(store_dir, 'objects', sha256[:2], f'{sha256}.mp3')
+
+
+def incoming_path(store_dir, name):
+    """Returns a scratch path in the store for a download that has not been hashed yet."""
+    return os.path.join(store_dir, 'incoming', f'{name}.mp3')
+
+
+def hash_file(file_path, chunk_size=1 << 20):
+    """Returns the sha256 checksum of a file that was not hashed while it was downloaded."""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def lookup_url(connection, url):
+    """Returns the checksum of the clip a URL resolved to, None if the URL was never stored."""
+    row = connection.execute('SELECT sha256 FROM urls WHERE url = ?', (url,)).fetchone()
+    return row[0] if row else None
+
+
+def add_clip(connection, store_dir, file_path, sha256, url):
+    """Moves a downloaded file into the store unless a clip with the same content exists.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store index.
+        store_dir (str): Directory of the store.
+        file_path (str): Downloaded file, removed or moved by this call.
+        sha256 (str): Checksum of the downloaded file.
+        url (str): URL the file was downloaded from.
+
+    Returns:
+        bool: True if the content was new, False if it was a duplicate.
+    """
+    destination = clip_path(store_dir, sha256)
+    # A clip deleted from disk behind the index's back is stored again
+    known = connection.execute('SELECT 1 FROM clips WHERE sha256 = ?', (sha256,)).fetchone()
+    known = known is not None and os.path.exists(destination)
+    with connection:
+        if known:
+            os.remove(file_path)
+        else:
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            size = os.path.getsize(file_path)
+            os.replace(file_path, destination)
+            connection.execute('INSERT OR REPLACE INTO clips VALUES (?, ?)', (sha256, size))
+        connection.execute('INSERT OR REPLACE INTO urls VALUES (?, ?)', (url, sha256))
+    return not known
+
+
+def add_reference(connection, channel, article_id, sha256, url):
+    """Records that an article's audio is the given clip.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store index.
+        channel (str): News channel of the article.
+        article_id (str): ID of the article.
+        sha256 (str): Checksum of the clip.
+        url (str): Audio URL of the article.
+    """
+    with connection:
+        connection.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?)', (channel, article_id, sha256, url))
+
+
+def link_clip(store_dir, sha256, dest_path):
+    """Makes `dest_path` point at a clip of the store.
+
+    A relative symlink is used so that `os.path.realpath` leads every article back to
+    its unique clip; a hard link or a copy is made where symlinks are not available.
+
+    Args:
+        store_dir (str): Directory of the store.
+        sha256 (str): Checksum of the clip.
+        dest_path (str): Per-article path, e.g. `downloaded_audio/<ID>.mp3`.
+    """
+    source = clip_path(store_dir, sha256)
+    if os.path.lexists(dest_path):
+        if os.path.realpath(dest_path) == os.path.realpath(source):
+            return
+        os.remove(dest_path)
+    try:
+        os.symlink(os.path.relpath(source, os.path.dirname(os.path.abspath(dest_path))), dest_path)
+    except OSError:
+        try:
+            os.link(source, dest_path)
+        except OSError:
+            shutil.copyfile(source, dest_path)
+
+
+def dedup_stats(connection):
+    """Summarises how much the store saved by keeping every clip once.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the store index.
+
+    Returns:
+        dict: Counts of articles, URLs and unique clips, and the stored and saved bytes.
+    """
+    articles, referenced_bytes = connection.execute(
+        'SELECT COUNT(*), COALESCE(SUM(clips.size), 0) FROM refs JOIN clips USING (sha256)'
+    ).fetchone()
+    clips, stored_bytes = connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM clips').fetchone()
+    urls = connection.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+    return {
+        'articles': articles,
+        'urls': urls,
+        'unique_clips': clips,
+        'stored_bytes': stored_bytes,
+        'saved_bytes': referenced_bytes - stored_bytes,
+    }
@@ -1,134 +1,347 @@
+import argparse
+import logging
 import os
 import pandas as pd
-import requests
 import re
 import json
+import sqlite3
+
+import metrics
+from article_store import article_store_path, iter_articles, open_article_store
+from news_table import TABLE_FORMATS, write_news_table
+from text_analysis import extract_speaker_from_text
+
+logger = logging.getLogger(__name__)
 
 data_root_dir = './data'  
 news_channels = ['RFA', 'VOA', 'VOT']
 
-data_list = []
+output_columns = ['ID', 'Audio URL', 'Audio Text', 'Speaker Name', 'Speaker Gender', 'News Channel', 'Publishing Year']
 
 # Regex pattern for validating URLs
 url_pattern = re.compile(r'^(http|https)://.*$')
 
-# Headers for RFA requests
-headers = {
-    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-    "accept-encoding": "gzip, deflate, br, zstd",
-    "accept-language": "en-US,en;q=0.9,en-IN;q=0.8",
-    "cache-control": "max-age=0",
-    "cookie": "AMCVS_518ABC7455E462B97F000101%40AdobeOrg=1; s_cc=true; utag_main=v_id:019169eade56002296e6ea4a443c0507d001b075008f7$_sn:11$_se:5$_ss:0$_st:1727788387180$vapi_domain:rfa.org$ses_id:1727793787%3Bexp-session$_pn:5%3Bexp-session; AMCV_518ABC7455E462B97F000101%40AdobeOrg=1176715910%7CMCIDTS%7C19997%7CMCMID%7C92058839809215745258174654077801968713%7CMCAID%7CNONE%7CMCOPTOUT-1727793787s%7CNONE%7CvVersion%7C5.4.0; s_sq=%5B%5BB%5D%5D",
-    "priority": "u=0, i",
-    "sec-ch-ua": "\"Microsoft Edge\";v=\"129\", \"Not=A?Brand\";v=\"8\", \"Chromium\";v=\"129\"",
-    "sec-ch-ua-mobile": "?0",
-    "sec-ch-ua-platform": "\"Windows\"",
-    "sec-fetch-dest": "document",
-    "sec-fetch-mode": "navigate",
-    "sec-fetch-site": "none",
-    "sec-fetch-user": "?1",
-    "upgrade-insecure-requests": "1",
-    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36 Edg/129.0.0.0"
-}
-
-def extract_speaker_from_text(body_text_lines):
-    """Extracts the speaker's name (the word immediately following 'གསར་འགོད་པ།') from the text.
+
+def build_article_row(channel, audio_id, audio_url, audio_text_lines, metadata):
+    """Builds the metadata row of one article from its saved URL, text and metadata.
+
+    Args:
+        channel (str): News channel of the article (e.g., 'RFA', 'VOA', 'VOT').
+        audio_id (str): ID of the article.
+        audio_url (str): Audio URL of the article, None if missing or invalid.
+        audio_text_lines (list): Lines of the article text, None if missing.
+        metadata (dict): Article metadata, None if missing.
+
+    Returns:
+        dict: Metadata row of the article.
+    """
+    audio_text = ''
+    speaker_name = ''
+    speaker_gender = ''
+    publishing_year = ''
+
+    if audio_text_lines is not None:
+        audio_text = ''.join(audio_text_lines).strip()  # Join all lines into a single string
+
+        # Extract speaker name from text for RFA, metadata is only used if none is found
+        if channel == 'RFA':
+            speaker_name = extract_speaker_from_text(audio_text_lines)
+
+    if metadata is not None:
+        if channel == 'VOA':
+            # Correct the publishing year for VOA
+            publishing_year = metadata.get('author', '')
+            speaker_name = metadata.get('speaker', '')
+        else:
+            # Use regular metadata for RFA and VOT
+            speaker_name_metadata = metadata.get('speaker', '')
+            # Only use speaker name from metadata if it is not 'unknown'
+            if speaker_name_metadata.lower() != 'unknown' and not speaker_name:
+                speaker_name = speaker_name_metadata
+            publishing_year = metadata.get('published_date', '')
+            speaker_gender = metadata.get('gender', '')
+
+    metrics.increment('articles_compiled')
+    return {
+        'ID': audio_id,
+        'Audio URL': audio_url if audio_url else 'URL not found',
+        'Audio Text': audio_text if audio_text else 'Transcript not found',
+        'Speaker Name': speaker_name,
+        'Speaker Gender': speaker_gender,
+        'News Channel': channel,
+        'Publishing Year': publishing_year
+    }
+
+
+def compile_article_row(channel, article_dir):
+    """Builds the metadata row of one article directory.
+
+    Args:
+        channel (str): News channel of the article (e.g., 'RFA', 'VOA', 'VOT').
+        article_dir (str): Directory holding the article's URL, text and metadata files.
+
+    Returns:
+        dict: Metadata row of the article.
+    """
+    audio_id = os.path.basename(article_dir)  # Get the folder name as the ID
+    audio_url = None
+    audio_text_lines = None
+    metadata = None
+
+    for file in os.listdir(article_dir):
+        if file.endswith('.txt') and file != 'news_text.txt':
+            audio_url_path = os.path.join(article_dir, file)
+            with open(audio_url_path, 'r', encoding='utf-8') as f:
+                url_content = f.read().strip()  # Read the URL and strip whitespace
+                if url_pattern.match(url_content):  # Validate if it's a URL
+                    audio_url = url_content
+
+        if file == 'news_text.txt':
+            text_file_path = os.path.join(article_dir, file)
+            with open(text_file_path, 'r', encoding='utf-8') as f:
+                audio_text_lines = f.readlines()  # Read all lines as a list
+
+        # Check for metadata JSON files
+        if file.endswith('.json'):
+            metadata_path = os.path.join(article_dir, file)
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+
+    return build_article_row(channel, audio_id, audio_url, audio_text_lines, metadata)
+
+
+def compile_packed_rows(channel, store_path):
+    """Builds the metadata rows of every article in a packed article store.
+
+    The store is read sequentially in one query instead of opening three files per article.
+
+    Args:
+        channel (str): News channel of the store.
+        store_path (str): Path of the packed article store.
+
+    Returns:
+        list: Metadata rows of the stored articles.
+    """
+    connection = open_article_store(store_path)
+    rows = [
+        build_article_row(
+            channel,
+            article_id,
+            audio_url if url_pattern.match(audio_url or '') else None,
+            body_text.splitlines(keepends=True),
+            metadata,
+        )
+        for article_id, audio_url, body_text, metadata in iter_articles(connection)
+    ]
+    connection.close()
+    return rows
+
+
+def add_packed_rows(rows, data_root_dir, news_channels):
+    """Adds the rows of the channels' packed article stores to the rows compiled from directories.
+
+    A channel can have both: directories left behind by a migration without
+    `--remove-dirs`, or written by a later extraction with `--storage files`. Articles
+    found in both are taken from their directory, which is either identical to the
+    stored copy or newer.
+
+    Args:
+        rows (list): Metadata rows compiled from the article directories, extended in place.
+        data_root_dir (str): Root data directory.
+        news_channels (list): News channels to compile.
+
+    Returns:
+        list: The metadata rows of both sources.
+    """
+    seen = {(row['News Channel'], row['ID']) for row in rows}
+    for channel in news_channels:
+        store_path = article_store_path(data_root_dir, channel)
+        if os.path.exists(store_path):
+            rows += [row for row in compile_packed_rows(channel, store_path) if (channel, row['ID']) not in seen]
+    return rows
+
+
+def iter_article_dirs(data_root_dir, news_channels):
+    """Yields (channel, article_dir) for every article directory of the given channels.
+
+    Args:
+        data_root_dir (str): Root data directory.
+        news_channels (list): News channels to scan.
+
+    Yields:
+        tuple: News channel and path of an article directory.
+    """
+    for channel in news_channels:
+        channel_dir = os.path.join(data_root_dir, channel, 'news_dataset_with_audio')
+
+        if not os.path.exists(channel_dir):
+            if not os.path.exists(article_store_path(data_root_dir, channel)):
+                logger.warning("Directory %s not found.", channel_dir)
+            continue
+
+        with os.scandir(channel_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    yield channel, entry.path
+
+
+def compile_news_metadata(data_root_dir, news_channels):
+    """Reads every article directory and packed article store and returns the metadata rows.
+
+    Args:
+        data_root_dir (str): Root data directory.
+        news_channels (list): News channels to compile.
+
+    Returns:
+        list: Metadata rows of all articles.
+    """
+    rows = [
+        compile_article_row(channel, article_dir)
+        for channel, article_dir in iter_article_dirs(data_root_dir, news_channels)
+    ]
+    return add_packed_rows(rows, data_root_dir, news_channels)
+
+
+def article_signature(article_dir):
+    """Returns the latest modification time and total size of an article directory.
+
+    Only `stat` calls are made, so this is much cheaper than re-reading the files.
 
     Args:
-        body_text_lines (list): List of lines in the text.
+        article_dir (str): Path of the article directory.
 
     Returns:
-        str: Extracted speaker's name or an empty string if not found.
+        tuple: Latest mtime in nanoseconds and total size in bytes.
     """
-    full_text = ' '.join(body_text_lines).replace('\n', ' ').strip()
-    print(f"Full text for speaker extraction: {full_text}")  
-    match = re.search(r'གསར་འགོད་པ།\s*(\S+)', full_text)
-    
-    if match:
-        print(f"Extracted speaker name: {match.group(1)}") 
-        return match.group(1)  # Return the word after 'གསར་འགོད་པ།'
-    
-    return ''  # Return empty if no match is found
-
-
-for channel in news_channels:
-    channel_dir = os.path.join(data_root_dir, channel, 'news_dataset_with_audio')
-    
-    if not os.path.exists(channel_dir):
-        print(f"Directory {channel_dir} not found.")
-        continue
-    
-    for root, dirs, files in os.walk(channel_dir):
-        audio_id = os.path.basename(root)  # Get the folder name as the ID
-        audio_url = None
-        audio_text = ''  
-        speaker_name = ''
-        speaker_gender = ''
-        publishing_year = ''
-        author = ''
-        
-        for file in files:
-            if file.endswith('.txt') and file != 'news_text.txt':
-                audio_url_path = os.path.join(root, file)
-                with open(audio_url_path, 'r', encoding='utf-8') as f:
-                    url_content = f.read().strip()  # Read the URL and strip whitespace
-                    if url_pattern.match(url_content):  # Validate if it's a URL
-                        audio_url = url_content
-            
-            if file == 'news_text.txt':
-                text_file_path = os.path.join(root, file)
-                if os.path.exists(text_file_path):
-                    with open(text_file_path, 'r', encoding='utf-8') as f:
-                        audio_text_lines = f.readlines()  # Read all lines as a list
-                        audio_text = ''.join(audio_text_lines).strip()  # Join all lines into a single string
-                        
-                        # Extract speaker name from text for RFA and VOT if not already found in metadata
-                        if channel == 'RFA': 
-                            speaker_name = extract_speaker_from_text(audio_text_lines)
-
-            # Check for metadata JSON files
-            if file.endswith('.json'):
-                metadata_path = os.path.join(root, file)
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r', encoding='utf-8') as f:
-                        metadata = json.load(f)
-
-                        if channel == 'VOA':
-                            # Correct the publishing year for VOA
-                            publishing_year = metadata.get('author', '') 
-                            speaker_name = metadata.get('speaker', '') 
-                        else:
-                            # Use regular metadata for RFA and VOT
-                            speaker_name_metadata = metadata.get('speaker', '')
-                            # Only use speaker name from metadata if it is not 'unknown'
-                            if speaker_name_metadata.lower() != 'unknown' and not speaker_name:
-                                speaker_name = speaker_name_metadata
-                            publishing_year = metadata.get('published_date', '') 
-                            speaker_gender = metadata.get('gender', '')
-
-        data_list.append({
-            'ID': audio_id,
-            'Audio URL': audio_url if audio_url else 'URL not found',
-            'Audio Text': audio_text if audio_text else 'Transcript not found',
-            'Speaker Name': speaker_name,
-            'Speaker Gender': speaker_gender,
-            'News Channel': channel,  
-            'Publishing Year': publishing_year
-        })
-
-# Sort data_list by ID
-data_list.sort(key=lambda x: x['ID'])
-
-# Create DataFrame and save to CSV
-df = pd.DataFrame(data_list, columns=['ID', 'Audio URL', 'Audio Text', 'Speaker Name', 'Speaker Gender', 'News Channel', 'Publishing Year'])
-output_metadata_csv_path = './news_data.csv'
-df.to_csv(output_metadata_csv_path, index=False, encoding='utf-8')
-print(f"CSV file saved at {output_metadata_csv_path}")
-
-# Create a session object
-session = requests.Session()
-session.headers.update(headers)
-
-# Directory to save downloaded RFA audio
-rfa_audio_dir = os.path.join(data_root_dir, 'RFA', 'downloaded_audio')
-os.makedirs(rfa_audio_dir, exist_ok=True)
+    mtime_ns = os.stat(article_dir).st_mtime_ns
+    size = 0
+    with os.scandir(article_dir) as entries:
+        for entry in entries:
+            stat = entry.stat()
+            mtime_ns = max(mtime_ns, stat.st_mtime_ns)
+            size += stat.st_size
+    return mtime_ns, size
+
+
+def open_index(index_path):
+    """Opens (and creates if needed) the SQLite index of compiled articles.
+
+    Args:
+        index_path (str): Path of the SQLite database.
+
+    Returns:
+        sqlite3.Connection: Connection to the index.
+    """
+    connection = sqlite3.connect(index_path)
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS articles ('
+        'article_dir TEXT PRIMARY KEY, channel TEXT, mtime_ns INTEGER, size INTEGER, row TEXT)'
+    )
+    return connection
+
+
+def compile_news_metadata_incremental(data_root_dir, news_channels, index_path):
+    """Compiles the metadata rows, re-reading only the articles that changed since the last run.
+
+    Every article directory is stored in the index with its signature and compiled row.
+    Directories whose signature is unchanged reuse the stored row, new or modified ones
+    are recompiled, and directories that disappeared are dropped from the index.
+    Packed article stores are read in full, which is already a single sequential scan,
+    and merged with `add_packed_rows`.
+
+    Args:
+        data_root_dir (str): Root data directory.
+        news_channels (list): News channels to compile.
+        index_path (str): Path of the SQLite index.
+
+    Returns:
+        list: Metadata rows of all articles.
+    """
+    connection = open_index(index_path)
+    known = {
+        article_dir: (mtime_ns, size)
+        for article_dir, mtime_ns, size in connection.execute(
+            'SELECT article_dir, mtime_ns, size FROM articles WHERE channel IN ({})'.format(
+                ','.join('?' * len(news_channels))
+            ),
+            news_channels,
+        )
+    }
+
+    changed = 0
+    seen = set()
+    with connection:
+        for channel, article_dir in iter_article_dirs(data_root_dir, news_channels):
+            seen.add(article_dir)
+            signature = article_signature(article_dir)
+            if known.get(article_dir) == signature:
+                continue
+            row = compile_article_row(channel, article_dir)
+            connection.execute(
+                'INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?)',
+                (article_dir, channel, signature[0], signature[1], json.dumps(row, ensure_ascii=False)),
+            )
+            changed += 1
+
+        removed = [(article_dir,) for article_dir in known if article_dir not in seen]
+        connection.executemany('DELETE FROM articles WHERE article_dir = ?', removed)
+
+    metrics.increment('articles_reused', len(seen) - changed)
+    logger.info(
+        "Recompiled %d new or changed articles, removed %d, reused %d.", changed, len(removed), len(seen) - changed
+    )
+
+    rows = [
+        json.loads(row)
+        for (row,) in connection.execute(
+            'SELECT row FROM articles WHERE channel IN ({})'.format(','.join('?' * len(news_channels))),
+            news_channels,
+        )
+    ]
+    connection.close()
+    return add_packed_rows(rows, data_root_dir, news_channels)
+
+
+def save_news_metadata(data_list, output_metadata_csv_path, table_format=None, partition_by_channel=False):
+    """Sorts the metadata rows by ID and saves them as CSV or Parquet.
+
+    Args:
+        data_list (list): Metadata rows.
+        output_metadata_csv_path (str): Path of the output table.
+        table_format (str): 'csv' or 'parquet', inferred from the path when omitted.
+        partition_by_channel (bool): Write one Parquet partition per news channel.
+    """
+    df = pd.DataFrame(data_list, columns=output_columns).sort_values('ID', kind='stable', ignore_index=True)
+    write_news_table(df, output_metadata_csv_path, table_format, partition_by_channel)
+    logger.info("News metadata saved at %s", output_metadata_csv_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the metadata of the news articles with audio.')
+    parser.add_argument('--data-dir', default=data_root_dir, help='Root data directory.')
+    parser.add_argument('--news-channels', nargs='+', default=news_channels, help='News channels to compile.')
+    parser.add_argument('--output', default='./news_data.csv', help='Path of the output table.')
+    parser.add_argument('--format', choices=TABLE_FORMATS, default=None,
+                        help='Output format, inferred from the output path when omitted.')
+    parser.add_argument('--partition-by-channel', action='store_true',
+                        help='Write one Parquet partition per news channel.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only re-read articles that changed since the last run.')
+    parser.add_argument('--index-path', default=None,
+                        help='SQLite index used by --incremental, defaults to <data-dir>/news_metadata_index.sqlite.')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args)
+
+    with metrics.profile_stage('compile'), metrics.timer('compile_seconds'):
+        if args.incremental:
+            index_path = args.index_path or os.path.join(args.data_dir, 'news_metadata_index.sqlite')
+            data_list = compile_news_metadata_incremental(args.data_dir, args.news_channels, index_path)
+        else:
+            data_list = compile_news_metadata(args.data_dir, args.news_channels)
+    save_news_metadata(data_list, args.output, args.format, args.partition_by_channel)
+    metrics.finish(args)
+
+
+if __name__ == "__main__":
+    main()
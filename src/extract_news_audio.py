@@ -1,24 +1,74 @@
+import argparse
 import json
+import logging
+import os
 import requests
 import subprocess
-import re
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
 from tqdm import tqdm
 
+import metrics
+from article_store import STORAGE_BACKENDS, article_store_path, open_article_store, save_articles
+from http_download import download_file, get_shared_session
+from text_analysis import extract_speaker_from_text
+
+try:
+    import ijson  # Optional: incremental parsing of large news dumps
+except ImportError:
+    ijson = None
+
+try:
+    import orjson  # Optional: faster parsing of whole news dumps
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# Dumps larger than this are parsed incrementally with ijson, when installed, to bound memory
+STREAMING_MIN_BYTES = 64 * 1024 ** 2
+
+NEWS_HOUSES = ['VOA', 'VOT', 'RFA']
+
+logger = logging.getLogger(__name__)
+
 def read_json_file(file_path):
     """Reads a json file and returns the content
 
+    orjson is used when it is installed, the standard library otherwise.
+
     Args:
         file_path (str): file path to the json file
 
     Returns:
         dict: json file content
     """
+    if orjson is not None:
+        with open(file_path, 'rb') as file:
+            return orjson.loads(file.read())
     with open(file_path, 'r', encoding='utf-8') as file:
         json_file_content = json.load(file)  # Load and return the content of the JSON file
     return json_file_content
 
+def iter_news_items(file_path):
+    """Yields (news_id, news_info) pairs from a news dump one article at a time.
+
+    Dumps are parsed in one go with `read_json_file`, which is the fastest option. Dumps
+    larger than `STREAMING_MIN_BYTES` are parsed incrementally with ijson when it is
+    installed, so that only one article is held in memory.
+
+    Args:
+        file_path (str): file path to the json file
+
+    Yields:
+        tuple: news id and its news information
+    """
+    if ijson is None or os.path.getsize(file_path) <= STREAMING_MIN_BYTES:
+        yield from read_json_file(file_path).items()
+        return
+    with open(file_path, 'rb') as file:
+        yield from ijson.kvitems(file, '', use_float=True)
+
 def has_news_audio(news_info):
     """Checks if news has audio
 
@@ -34,22 +84,6 @@ def has_news_audio(news_info):
 
     return bool(news_audio_url)
 
-def extract_speaker_from_text(body_text_lines):
-    """Extracts speaker's name from the text after the phrase 'གསར་འགོད་པ།'.
-
-    Args:
-        body_text_lines (list): List of lines in the text.
-
-    Returns:
-        str: Extracted speaker's name or empty string if not found.
-    """
-    # Regular expression to find 'གསར་འགོད་པ།' and capture the next word
-    for line in body_text_lines:
-        match = re.search(r'གསར་འགོད་པ།\s+(\S+)', line)
-        if match:
-            return match.group(1)  # Return the word after 'གསར་འགོད་པ།'
-    return ''  # Return empty if no match is found
-
 def prepare_news_data_with_audio(news_info, news_house):
     """Prepares a structure for news data with audio, including speaker's name if applicable for the news house.
 
@@ -99,106 +133,251 @@ def get_news_with_audio(news_data, news_house):
             news_data_with_audio[news_id] = prepare_news_data_with_audio(news_info, news_house)
     return news_data_with_audio
    
-def download_stream_file(url, dest_path):
-    """Downloads a stream file using ffmpeg and saves it with .mp3 extension.
+STREAM_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36"
+
+def capture_stream(url, dest_path, timeout=None):
+    """Captures a stream with ffmpeg, raising if ffmpeg fails or runs past `timeout`.
+
+    The capture is written next to `dest_path` and renamed once ffmpeg has finished,
+    so an interrupted capture never leaves a truncated file at `dest_path`.
 
     Args:
-        url (str): url of the file
+        url (str): url of the stream
         dest_path (str): destination path to save the file
+        timeout (float): seconds after which ffmpeg is killed, no limit when None
 
     Returns:
         str: destination path of the file
     """
-    user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/87.0.4280.88 Safari/537.36"
+    dest_path = Path(dest_path)
+    part_path = dest_path.with_name(f"{dest_path.stem}.part{dest_path.suffix}")
+    command = [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error",
+        "-headers", f"User-Agent: {STREAM_USER_AGENT}", "-i", url, "-c", "copy", str(part_path),
+    ]
     try:
-        subprocess.run(["ffmpeg", "-headers", f"User-Agent: {user_agent}", "-i", url, "-c", "copy", dest_path], check=True)
-        print(f"Downloaded stream file: {url}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error downloading stream file: {e}")
+        with metrics.timer('ffmpeg_seconds'):
+            subprocess.run(command, check=True, timeout=timeout, capture_output=True)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        part_path.unlink(missing_ok=True)
+        metrics.increment('streams_failed')
+        raise
+    part_path.replace(dest_path)
+    metrics.increment('streams_captured')
+    return str(dest_path)
+
+def download_stream_file(url, dest_path, timeout=None):
+    """Downloads a stream file using ffmpeg and saves it with .mp3 extension.
+
+    Args:
+        url (str): url of the file
+        dest_path (str): destination path to save the file
+        timeout (float): seconds after which ffmpeg is killed, no limit when None
 
-def download_mp3_file(url, dest_path):
+    Returns:
+        str: destination path of the file, None if the download failed
+    """
+    try:
+        capture_stream(url, dest_path, timeout)
+        logger.info("Downloaded stream file: %s", url)
+        return dest_path
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        logger.error("Error downloading stream file: %s", e)
+        return None
+
+def download_mp3_file(url, dest_path, session=None):
     """function to download the mp3 file
 
+    The file is streamed to disk in large chunks over a pooled session, checked against
+    the announced Content-Length, and skipped if a complete copy is already present.
+
     Args:
         url (str): link of the audio file
         dest_path (str): destination of the file path
+        session (requests.Session): session to use, defaults to the shared pooled session
     """
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        with open(dest_path, 'wb') as file:
-            file.write(response.content)
-    else:
-        print(f"Failed to download the MP3 file: {url}, status code: {response.status_code}")
+    try:
+        download_file(session or get_shared_session(), url, dest_path, skip_existing=True)
+    except requests.RequestException as e:
+        metrics.increment('downloads_failed')
+        logger.warning("Failed to download the MP3 file: %s, error: %s", url, e)
 
-def save_body_text(article_data, article_dir):
-    """Saves the body text of the article to a text file.
+def get_audio_url(article_data):
+    """Returns the first audio URL of an article.
 
     Args:
-        article_data (dict): The article data containing the body text.
-        article_dir (Path): The directory where the text file will be saved.
-    """
-    with open(article_dir / 'news_text.txt', 'w', encoding='utf-8') as text_file:
-        text_file.write(article_data['body_text'])
+        article_data (dict): The article data containing the audio URL.
 
-def save_metadata(article_data, article_dir):
-    """Saves metadata of the article to a JSON file.
-
-    Args:
-        article_data (dict): The article data containing metadata.
-        article_dir (Path): The directory where the metadata file will be saved.
+    Returns:
+        str: The audio URL.
     """
-    with open(article_dir / 'metadata.json', 'w', encoding='utf-8') as meta_file:
-        json.dump(article_data['metadata'], meta_file, ensure_ascii=False, indent=4)
+    audio_url = article_data['audio_url']
+    if isinstance(audio_url, list) and audio_url:
+        audio_url = audio_url[0]  # Use the first audio URL
+    return audio_url
 
-def save_news_file(article_data, article_id, output_dir):
+def save_news_file(article_data, article_id, output_dir, store=None):
     """Saves content to a file
 
     Args:
         article_data (dict): The article data containing audio URL, body text, and metadata.
         article_id (str): The ID of the article, used for naming the directory.
         output_dir (Path): The directory where the article data will be saved.
+        store (sqlite3.Connection): Packed article store written instead of `output_dir`.
     """
-def save_news_file(article_data, article_id, output_dir):
-    """Saves content to a file
+    if save_news_files([(article_id, article_data)], output_dir, store):
+        logger.debug("Audio URL saved for article %s as %s_audio_url.txt", article_id, article_id)
+
+def save_news_files(articles, output_dir, store=None):
+    """Saves a batch of articles, writing each article's files back to back.
+
+    All file contents of the batch are serialised before the first file is written, so
+    the writes are not interleaved with parsing; each article still gets its own
+    directory and three files. With a packed article store the batch is written as
+    one transaction instead.
 
     Args:
-        article_data (dict): The article data containing audio URL, body text, and metadata.
-        article_id (str): The ID of the article, used for naming the directory.
+        articles (list): List of (article_id, article_data) tuples.
         output_dir (Path): The directory where the article data will be saved.
+        store (sqlite3.Connection): Packed article store written instead of `output_dir`.
+
+    Returns:
+        list: (article_id, audio_url) tuples of the articles saved.
     """
-    article_dir = output_dir / article_id
-    article_dir.mkdir(parents=True, exist_ok=True)
+    pending = []
+    for article_id, article_data in articles:
+        audio_url = get_audio_url(article_data)
+        if not audio_url.startswith(('http://', 'https://')):
+            logger.warning("Invalid audio URL for article %s: %s", article_id, audio_url)
+            continue
+        metadata = json.dumps(article_data['metadata'], ensure_ascii=False, indent=4)
+        pending.append((article_id, audio_url, output_dir / article_id, {
+            f"{article_id}_audio_url.txt": audio_url,
+            'news_text.txt': article_data['body_text'],
+            'metadata.json': metadata,
+        }))
+
+    if store is not None:
+        save_articles(store, [
+            (article_id, audio_url, files['news_text.txt'], files['metadata.json'])
+            for article_id, audio_url, _, files in pending
+        ])
+        return [(article_id, audio_url) for article_id, audio_url, _, _ in pending]
+
+    for _, _, article_dir, files in pending:
+        article_dir.mkdir(parents=True, exist_ok=True)
+        for file_name, content in files.items():
+            with open(article_dir / file_name, 'w', encoding='utf-8') as file:
+                file.write(content)
+    return [(article_id, audio_url) for article_id, audio_url, _, _ in pending]
+
+def process_news_dataset_file(news_dataset_file_path, news_house, output_dir, batch_size=500, store_path=None):
+    """Filters the articles with audio out of one news dump and saves them in batches.
 
-    audio_url = article_data['audio_url']
-    
-    if isinstance(audio_url, list) and audio_url:
-        audio_url = audio_url[0]  # Use the first audio URL
-    
-    if not audio_url.startswith(('http://', 'https://')):
-        print(f"Invalid audio URL for article {article_id}: {audio_url}")
-        return
+    Args:
+        news_dataset_file_path (Path): Path of the news dump.
+        news_house (str): The news house identifier (e.g., 'VOA', 'VOT', 'RFA').
+        output_dir (Path): The directory where the article data will be saved.
+        batch_size (int): Number of articles written per batch.
+        store_path (str): Packed article store written instead of `output_dir`.
 
-    # Instead of downloading, save the audio URL to a text file
-    with open(article_dir / f"{article_id}_audio_url.txt", 'w', encoding='utf-8') as url_file:
-        url_file.write(audio_url)
-    print(f"Audio URL saved for article {article_id} as {article_id}_audio_url.txt")
+    Returns:
+        tuple: Number of articles read and the (article_id, audio_url) tuples of the articles saved.
+    """
+    articles_read = 0
+    articles_saved = []
+    batch = []
+    store = open_article_store(store_path) if store_path else None
+    try:
+        with metrics.timer('file_processing_seconds'):
+            for news_id, news_info in iter_news_items(news_dataset_file_path):
+                articles_read += 1
+                if not has_news_audio(news_info):
+                    continue
+                batch.append((news_id, prepare_news_data_with_audio(news_info, news_house)))
+                if len(batch) >= batch_size:
+                    articles_saved += save_news_files(batch, output_dir, store)
+                    batch = []
+            if batch:
+                articles_saved += save_news_files(batch, output_dir, store)
+    finally:
+        if store is not None:
+            store.close()
+    metrics.increment('files_parsed')
+    metrics.increment('articles_read', articles_read)
+    metrics.increment('articles_with_audio', len(articles_saved))
+    return articles_read, articles_saved
+
+def run_pipeline(news_houses, data_dir='./data', workers=1, batch_size=500, executor=None, on_saved=None,
+                 storage='files'):
+    """Extracts the news with audio of every news house, spreading the dumps over worker processes.
 
-    save_body_text(article_data, article_dir)
-    save_metadata(article_data, article_dir)
+    Args:
+        news_houses (list): News house identifiers to process.
+        data_dir (str): Root data directory containing `<news_house>/news_dataset`.
+        workers (int): Number of worker processes; 1 processes the files in this process.
+        batch_size (int): Number of articles written per batch.
+        executor (concurrent.futures.Executor): Process pool shared with other stages, used
+            instead of starting one.
+        on_saved (callable): Called with the news house and the (article_id, audio_url)
+            tuples of every dump as soon as it is processed, e.g. to start downloads early.
+        storage (str): 'files' writes one directory per article to `news_dataset_with_audio`,
+            'sqlite' writes the packed article store of each news house.
 
-if __name__ == "__main__":
-    news_houses = ['VOA', 'VOT', 'RFA']
+    Returns:
+        dict: Number of articles read and saved per news house.
+    """
+    jobs = []
     for news_house in news_houses:
-        news_dataset_dir = Path(f'./data/{news_house}/news_dataset')
-        output_dir = Path(f'./data/{news_house}/news_dataset_with_audio')
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        news_dataset_file_paths = list(news_dataset_dir.iterdir())
-        news_dataset_file_paths.sort()
+        news_dataset_dir = Path(data_dir) / news_house / 'news_dataset'
+        output_dir = Path(data_dir) / news_house / 'news_dataset_with_audio'
+        store_path = article_store_path(data_dir, news_house) if storage == 'sqlite' else None
+        if store_path is None:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        for news_dataset_file_path in sorted(news_dataset_dir.iterdir()):
+            jobs.append((news_dataset_file_path, news_house, output_dir, batch_size, store_path))
+
+    summary = {news_house: {'read': 0, 'saved': 0} for news_house in news_houses}
+
+    def record(news_house, counts):
+        articles_read, articles_saved = counts
+        summary[news_house]['read'] += articles_read
+        summary[news_house]['saved'] += len(articles_saved)
+        if on_saved and articles_saved:
+            on_saved(news_house, articles_saved)
+
+    if workers <= 1 and executor is None:
+        for job in tqdm(jobs, desc='Processing news files'):
+            record(job[1], process_news_dataset_file(*job))
+        return summary
+
+    with nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(metrics.run_with_metrics, process_news_dataset_file, *job): job for job in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures), desc='Processing news files'):
+            counts, worker_metrics = future.result()
+            metrics.merge(worker_metrics)
+            record(futures[future][1], counts)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract the news articles that have audio.')
+    parser.add_argument('--news-houses', nargs='+', default=NEWS_HOUSES, choices=NEWS_HOUSES,
+                        help='News houses to process.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes.')
+    parser.add_argument('--data-dir', default='./data', help='Root data directory.')
+    parser.add_argument('--batch-size', type=int, default=500, help='Articles written per batch.')
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='files',
+                        help="'files' writes a directory per article, 'sqlite' one packed store per news house.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args)
+
+    with metrics.profile_stage('extract'):
+        summary = run_pipeline(args.news_houses, args.data_dir, args.workers, args.batch_size,
+                               storage=args.storage)
+    for news_house, counts in summary.items():
+        logger.info("%s: %d of %d articles have audio", news_house, counts['saved'], counts['read'])
+    metrics.finish(args)
 
-        for news_dataset_file_path in tqdm(news_dataset_file_paths, desc=f'Processing {news_house} news files'):
-            news_data = read_json_file(news_dataset_file_path)
-            news_data_with_audio = get_news_with_audio(news_data, news_house)
-
-            for article_id, article_data in tqdm(news_data_with_audio.items(), desc='Saving articles'):
-                save_news_file(article_data, article_id, output_dir)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import librosa
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Canonical representation: mono float32 at a rate that is plenty for pitch and energy analysis
+CACHE_SR = 8000
+RES_TYPE = 'soxr_qq'
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def open_feature_cache(cache_dir):
+    """Opens (and creates if needed) the audio feature cache.
+
+    Every source file is decoded once to `<sha256[:2]>/<sha256>/audio.npy` and the
+    features computed from it are stored next to it as `<name>.npy`. The SQLite index
+    remembers the content hash of every source file by size and mtime, and the size and
+    last use of every entry for LRU eviction.
+
+    Args:
+        cache_dir (str): Directory of the cache.
+
+    Returns:
+        sqlite3.Connection: Connection to the cache index.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(cache_dir, 'feature_cache.sqlite'), timeout=60)
+    connection.executescript(
+        'CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT);'
+        'CREATE TABLE IF NOT EXISTS entries (sha256 TEXT PRIMARY KEY, bytes INTEGER, last_used REAL);'
+    )
+    return connection
+
+
+def content_hash(connection, audio_file):
+    """Returns the SHA-256 of a file, hashing it only if it changed since it was last seen.
+
+    Args:
+        connection (sqlite3.Connection): Connection to the cache index.
+        audio_file (str): Path of the audio file.
+
+    Returns:
+        str: Hex digest of the file content.
+    """
+    path = os.path.realpath(audio_file)
+    stat = os.stat(path)
+    row = connection.execute('SELECT size, mtime_ns, sha256 FROM files WHERE path = ?', (path,)).fetchone()
+    if row and row[:2] == (stat.st_size, stat.st_mtime_ns):
+        return row[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as audio:
+        for chunk in iter(lambda: audio.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    with connection:
+        connection.execute(
+            'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (path, stat.st_size, stat.st_mtime_ns, sha256)
+        )
+    return sha256
+
+
+def entry_dir(cache_dir, sha256):
+    """Returns the directory holding the decoded audio and features of one source file."""
+    return os.path.join(cache_dir, sha256[:2], sha256)
+
+
+def _store_array(connection, cache_dir, sha256, name, array):
+    directory = entry_dir(cache_dir, sha256)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.npy')
+    # Every writer gets its own temporary file, so workers storing the same array do not clobber each other
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=f'{name}.', suffix='.part', delete=False) as array_file:
+        try:
+            np.save(array_file, array)
+        except BaseException:
+            os.remove(array_file.name)
+            raise
+    os.replace(array_file.name, path)
+    # The size is recounted from disk so that arrays stored again do not count twice
+    with os.scandir(directory) as entries:
+        size = sum(entry.stat().st_size for entry in entries if entry.name.endswith('.npy'))
+    with connection:
+        connection.execute(
+            'INSERT INTO entries VALUES (?, ?, ?) '
+            'ON CONFLICT (sha256) DO UPDATE SET bytes = excluded.bytes, last_used = excluded.last_used',
+            (sha256, size, time.time()),
+        )
+    return np.load(path, mmap_mode='r')
+
+
+def _load_array(connection, cache_dir, sha256, name):
+    path = os.path.join(entry_dir(cache_dir, sha256), f'{name}.npy')
+    if not os.path.exists(path):
+        return None
+    with connection:
+        connection.execute('UPDATE entries SET last_used = ? WHERE sha256 = ?', (time.time(), sha256))
+    return np.load(path, mmap_mode='r')
+
+
+def load_audio(cache_dir, audio_file):
+    """Returns the canonical decoded audio of a file, decoding it only on the first request.
+
+    Args:
+        cache_dir (str): Directory of the cache.
+        audio_file (str): Path of the audio file.
+
+    Returns:
+        np.ndarray: Memory-mapped mono float32 audio at `CACHE_SR`.
+    """
+    connection = open_feature_cache(cache_dir)
+    try:
+        sha256 = content_hash(connection, audio_file)
+        samples = _load_array(connection, cache_dir, sha256, 'audio')
+        if samples is not None:
+            metrics.increment('feature_cache_hits')
+            return samples
+        metrics.increment('feature_cache_misses')
+        with metrics.timer('decode_seconds'):
+            samples, _ = librosa.load(audio_file, sr=CACHE_SR, mono=True, res_type=RES_TYPE)
+        return _store_array(connection, cache_dir, sha256, 'audio', samples.astype(np.float32))
+    finally:
+        connection.close()
+
+
+def load_feature(cache_dir, audio_file, name, compute):
+    """Returns a feature of a file, computing it from the cached audio on the first request.
+
+    Args:
+        cache_dir (str): Directory of the cache.
+        audio_file (str): Path of the audio file.
+        name (str): Name of the feature, e.g. 'pitch'.
+        compute (callable): Computes the feature array from `(samples, sr)`.
+
+    Returns:
+        np.ndarray: Memory-mapped feature array.
+    """
+    connection = open_feature_cache(cache_dir)
+    try:
+        sha256 = content_hash(connection, audio_file)
+        feature = _load_array(connection, cache_dir, sha256, name)
+        if feature is not None:
+            metrics.increment('feature_cache_hits')
+            return feature
+        metrics.increment('feature_cache_misses')
+        samples = load_audio(cache_dir, audio_file)
+        with metrics.timer(f'{name}_seconds'):
+            feature = compute(samples, CACHE_SR)
+        return _store_array(connection, cache_dir, sha256, name, np.asarray(feature))
+    finally:
+        connection.close()
+
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """Deletes the least recently used entries until the cache fits in `max_bytes`.
+
+    Args:
+        cache_dir (str): Directory of the cache.
+        max_bytes (int): Size limit of the decoded audio and features.
+
+    Returns:
+        int: Number of bytes freed.
+    """
+    connection = open_feature_cache(cache_dir)
+    total = connection.execute('SELECT COALESCE(SUM(bytes), 0) FROM entries').fetchone()[0]
+    freed = 0
+    with connection:
+        for sha256, size in connection.execute('SELECT sha256, bytes FROM entries ORDER BY last_used').fetchall():
+            if total - freed <= max_bytes:
+                break
+            try:
+                shutil.rmtree(entry_dir(cache_dir, sha256))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # The entry stays indexed so that a later eviction tries again
+                logger.warning("Could not evict %s from the feature cache: %s", sha256, e)
+                continue
+            connection.execute('DELETE FROM entries WHERE sha256 = ?', (sha256,))
+            freed += size
+    connection.close()
+    if freed:
+        metrics.increment('feature_cache_evicted_bytes', freed)
+        logger.info("Evicted %.1f MB from the feature cache.", freed / 1e6)
+    return freed
@@ -1,48 +1,190 @@
+import argparse
+import logging
+import math
 import os
-import pandas as pd
-from mutagen.mp3 import MP3  # To get audio duration
-from datetime import datetime
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 
+import metrics
+from feature_cache import CACHE_SR, DEFAULT_MAX_BYTES, evict, load_audio
+from mp3_duration import probe_mp3_duration
+from news_table import TABLE_FORMATS, audio_file_paths, read_news_table, write_news_table
 
-metadata_csv_path = './news_audio_with_duration.csv'
-df = pd.read_csv(metadata_csv_path)
+logger = logging.getLogger(__name__)
 
-updated_data = []
 
-for index, row in df.iterrows():
-    audio_id = row['ID']
-    audio_url = row['Audio URL']
-    audio_text = row['Audio Text']
-    speaker_name = row['Speaker Name']
-    speaker_gender = row['Speaker Gender']
-    news_channel = row['News Channel']
-    publishing_year = row['Publishing Year']
-    
-    audio_duration = 'Duration not found'
+def open_duration_cache(cache_path):
+    """Opens (and creates if needed) the SQLite cache of probed durations.
 
-    audio_file_path = os.path.join('./data', news_channel, 'downloaded_audio', f"{audio_id}.mp3")
+    Args:
+        cache_path (str): Path of the SQLite database.
 
-    if os.path.exists(audio_file_path):
+    Returns:
+        sqlite3.Connection: Connection to the cache.
+    """
+    connection = sqlite3.connect(cache_path)
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS durations ('
+        'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, seconds REAL)'
+    )
+    return connection
+
+
+def probe_duration(audio_file_path, feature_cache_dir=None):
+    """Probes one file for the worker pool, turning errors into a missing duration.
+
+    Durations are read from the MP3 headers. Files whose headers cannot be parsed are
+    measured from their decoded audio in the feature cache when one is given.
+
+    Args:
+        audio_file_path (str): Path of the MP3 file.
+        feature_cache_dir (str): Feature cache used for files without readable headers.
+
+    Returns:
+        float: Duration in seconds, or NaN if it could not be read.
+    """
+    try:
+        with metrics.timer('probe_seconds'):
+            return probe_mp3_duration(audio_file_path)
+    except Exception as e:
+        if feature_cache_dir:
+            try:
+                return len(load_audio(feature_cache_dir, audio_file_path)) / CACHE_SR
+            except Exception as decode_error:
+                e = decode_error
+        metrics.increment('probe_errors')
+        logger.warning("Error reading duration for %s: %s", audio_file_path, e)
+        return float('nan')
+
+
+def probe_duration_chunk(audio_file_paths, feature_cache_dir=None):
+    """Probes a chunk of files in one worker task."""
+    return [probe_duration(audio_file_path, feature_cache_dir) for audio_file_path in audio_file_paths]
+
+
+def probe_durations(audio_file_paths, cache_path=None, max_workers=None, feature_cache_dir=None, executor=None):
+    """Returns the duration of every file, probing only the files missing from the cache.
+
+    Cache entries are keyed on path, size and mtime, so a replaced file is probed again.
+
+    Args:
+        audio_file_paths (list): Paths of the MP3 files.
+        cache_path (str): Path of the SQLite cache; no caching when omitted.
+        max_workers (int): Number of worker processes, defaults to the number of CPUs.
+        feature_cache_dir (str): Feature cache used for files without readable headers.
+        executor (concurrent.futures.ProcessPoolExecutor): Pool shared with other stages, used
+            instead of starting one.
+
+    Returns:
+        dict: Duration in seconds per path, NaN for missing or unreadable files.
+    """
+    signatures = {}
+    for audio_file_path in set(audio_file_paths):
         try:
-            audio = MP3(audio_file_path)
-            audio_duration = str(datetime.utcfromtimestamp(audio.info.length).strftime('%H:%M:%S'))
-        except Exception as e:
-            print(f"Error reading duration for {audio_file_path}: {e}")
-
-    updated_data.append({
-        'ID': audio_id,
-        'Audio URL': audio_url,
-        'Audio Text': audio_text,
-        'Audio Duration': audio_duration,
-        'Speaker Name': speaker_name,
-        'Speaker Gender': speaker_gender,
-        'News Channel': news_channel,
-        'Publishing Year': publishing_year
-    })
-
-updated_df = pd.DataFrame(updated_data)
-
-output_updated_csv_path = './news_data_with_duration.csv'
-updated_df.to_csv(output_updated_csv_path, index=False, encoding='utf-8')
-
-print(f"Updated CSV file saved at {output_updated_csv_path}")
+            stat = os.stat(audio_file_path)
+        except FileNotFoundError:
+            continue
+        signatures[audio_file_path] = (stat.st_size, stat.st_mtime_ns)
+
+    durations = {audio_file_path: float('nan') for audio_file_path in audio_file_paths}
+    connection = open_duration_cache(cache_path) if cache_path else None
+    if connection:
+        cached = connection.execute('SELECT path, size, mtime_ns, seconds FROM durations')
+        for path, size, mtime_ns, seconds in cached:
+            if signatures.get(path) == (size, mtime_ns):
+                durations[path] = seconds
+
+    to_probe = [path for path in signatures if math.isnan(durations[path])]
+    probed = []
+    if to_probe:
+        chunk_size = max(1, len(to_probe) // (4 * (max_workers or os.cpu_count() or 1)))
+        chunks = [to_probe[start:start + chunk_size] for start in range(0, len(to_probe), chunk_size)]
+        probe_chunk = partial(metrics.run_with_metrics, probe_duration_chunk, feature_cache_dir=feature_cache_dir)
+        with nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for chunk_durations, worker_metrics in pool.map(probe_chunk, chunks):
+                probed.extend(chunk_durations)
+                metrics.merge(worker_metrics)
+        durations.update(zip(to_probe, probed))
+
+    if connection:
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO durations VALUES (?, ?, ?, ?)',
+                [
+                    (path, *signatures[path], seconds)
+                    for path, seconds in zip(to_probe, probed)
+                    if not math.isnan(seconds)
+                ],
+            )
+        connection.close()
+
+    metrics.increment('durations_probed', len(to_probe))
+    metrics.increment('durations_cached', len(signatures) - len(to_probe))
+    logger.info("Probed %d audio files, %d durations read from cache.", len(to_probe), len(signatures) - len(to_probe))
+    return durations
+
+
+def add_audio_duration(df, data_root_dir='./data', cache_path=None, max_workers=None, feature_cache_dir=None,
+                       executor=None, feature_cache_max_bytes=DEFAULT_MAX_BYTES):
+    """Adds an 'Audio Duration' column with the duration in seconds of each downloaded audio file.
+
+    Args:
+        df (pd.DataFrame): News table.
+        data_root_dir (str): Root data directory holding `<channel>/downloaded_audio`.
+        cache_path (str): Path of the SQLite duration cache.
+        max_workers (int): Number of worker processes.
+        feature_cache_dir (str): Feature cache used for files without readable headers.
+        executor (concurrent.futures.ProcessPoolExecutor): Pool shared with other stages, used
+            instead of starting one.
+        feature_cache_max_bytes (int): Size the feature cache is trimmed to afterwards.
+
+    Returns:
+        pd.DataFrame: News table with the audio durations.
+    """
+    # Articles linked to the same clip of the audio store resolve to one path and are probed once
+    paths = audio_file_paths(df, data_root_dir, resolve_links=True)
+    durations = probe_durations(paths.unique().tolist(), cache_path, max_workers, feature_cache_dir, executor)
+    if feature_cache_dir:
+        evict(feature_cache_dir, feature_cache_max_bytes)
+
+    updated_df = df.copy()
+    position = updated_df.columns.get_loc('Audio Text') + 1
+    updated_df.insert(position, 'Audio Duration', paths.map(durations).astype('float64').to_numpy())
+    return updated_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Add the audio duration to the news table.')
+    parser.add_argument('--input', default='./news_data.csv', help='Path of the input table.')
+    parser.add_argument('--output', default='./news_data_with_duration.csv', help='Path of the output table.')
+    parser.add_argument('--format', choices=TABLE_FORMATS, default=None,
+                        help='Output format, inferred from the output path when omitted.')
+    parser.add_argument('--partition-by-channel', action='store_true',
+                        help='Write one Parquet partition per news channel.')
+    parser.add_argument('--data-dir', default='./data', help='Root data directory.')
+    parser.add_argument('--cache-path', default=None,
+                        help='SQLite duration cache, defaults to <data-dir>/audio_duration_cache.sqlite.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    parser.add_argument('--feature-cache-dir', default=None,
+                        help='Measure files without readable MP3 headers from the shared feature cache.')
+    parser.add_argument('--feature-cache-max-gb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                        help='Size limit of the feature cache; least recently used entries are evicted.')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args)
+
+    cache_path = args.cache_path or os.path.join(args.data_dir, 'audio_duration_cache.sqlite')
+    df = read_news_table(args.input)
+    with metrics.profile_stage('duration'):
+        updated_df = add_audio_duration(df, args.data_dir, cache_path, args.workers, args.feature_cache_dir,
+                                        feature_cache_max_bytes=int(args.feature_cache_max_gb * 1024 ** 3))
+    write_news_table(updated_df, args.output, args.format, args.partition_by_channel)
+
+    logger.info("Updated news table saved at %s", args.output)
+    metrics.finish(args)
+
+
+if __name__ == "__main__":
+    main()
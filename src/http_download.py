@@ -0,0 +1,175 @@
+import hashlib
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+CHUNK_SIZE = 1 << 20  # 1 MiB
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+class IncompleteDownloadError(requests.RequestException):
+    """Raised when fewer or more bytes arrived than the server announced."""
+
+
+def create_session(pool_size=16, headers=None):
+    """Creates a requests session whose connection pool can serve `pool_size` concurrent transfers.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host.
+        headers (dict): Default headers to send with every request.
+
+    Returns:
+        requests.Session: Session object with a sized connection pool.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_shared_session(pool_size=16):
+    """Returns the process-wide pooled session, creating it on first use.
+
+    Args:
+        pool_size (int): Maximum number of pooled connections per host.
+
+    Returns:
+        requests.Session: Shared session object.
+    """
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = create_session(pool_size)
+    return _shared_session
+
+
+def _hash_existing_file(file_path, hasher):
+    """Feeds the bytes already on disk into the hasher and returns how many there were."""
+    size = 0
+    with open(file_path, 'rb') as existing_file:
+        for chunk in iter(lambda: existing_file.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            size += len(chunk)
+    return size
+
+
+def _identity_headers(headers):
+    """Copies the headers, asking for an unencoded body so byte counts match what is written."""
+    request_headers = {key: value for key, value in (headers or {}).items() if key.lower() != 'accept-encoding'}
+    request_headers['Accept-Encoding'] = 'identity'
+    return request_headers
+
+
+def _expected_size(response, resume_from):
+    """Returns the full size of the resource announced by the response, None if unknown."""
+    content_range = response.headers.get('Content-Range', '')
+    if response.status_code == 206 and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        return int(content_length) + (resume_from if response.status_code == 206 else 0)
+    return None
+
+
+def is_download_complete(session, url, dest_path, headers=None, timeout=60):
+    """Checks an existing file against the size the server announces for the URL.
+
+    Args:
+        session (requests.Session): Session object for making requests.
+        url (str): URL of the file.
+        dest_path (str): Path of the file on disk.
+        headers (dict): Extra headers for this request.
+        timeout (int): Connect/read timeout in seconds.
+
+    Returns:
+        bool: True if the file exists and its size matches (or the server does not announce one).
+    """
+    if not os.path.exists(dest_path):
+        return False
+    request_headers = _identity_headers(headers)
+    response = session.head(url, headers=request_headers, allow_redirects=True, timeout=timeout)
+    if not response.ok:
+        return False
+    expected = _expected_size(response, 0)
+    return expected is None or expected == os.path.getsize(dest_path)
+
+
+def download_file(session, url, dest_path, headers=None, chunk_size=CHUNK_SIZE, timeout=60, skip_existing=False):
+    """Streams a file to disk, resuming a previous partial download if one exists.
+
+    The file is written to `<dest_path>.part` and only renamed to `dest_path` once the
+    transfer has finished and its size matches the announced `Content-Length`, so
+    `dest_path` never holds a truncated file.
+
+    Args:
+        session (requests.Session): Session object for making requests.
+        url (str): URL of the file.
+        dest_path (str): Destination path of the file.
+        headers (dict): Extra headers for this request.
+        chunk_size (int): Number of bytes read from the response at a time.
+        timeout (int): Connect/read timeout in seconds.
+        skip_existing (bool): Keep `dest_path` without downloading if it passes `is_download_complete`.
+
+    Returns:
+        dict: Download result with the number of bytes on disk and their sha256 checksum.
+    """
+    hasher = hashlib.sha256()
+    if skip_existing and is_download_complete(session, url, dest_path, headers, timeout):
+        size = _hash_existing_file(dest_path, hasher)
+        metrics.increment('files_skipped')
+        return {'bytes': size, 'sha256': hasher.hexdigest(), 'resumed': False, 'skipped': True}
+
+    part_path = f'{dest_path}.part'
+    request_headers = _identity_headers(headers)
+
+    resume_from = 0
+    if os.path.exists(part_path):
+        resume_from = _hash_existing_file(part_path, hasher)
+        if resume_from:
+            request_headers['Range'] = f'bytes={resume_from}-'
+
+    start = time.perf_counter()
+    with session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416 and resume_from:
+            # The partial file already holds the whole resource
+            os.replace(part_path, dest_path)
+            return {'bytes': resume_from, 'sha256': hasher.hexdigest(), 'resumed': True, 'skipped': False}
+
+        response.raise_for_status()  # Check for HTTP errors
+
+        if resume_from and response.status_code != 206:
+            # Server ignored the Range header, start over
+            resume_from = 0
+            hasher = hashlib.sha256()
+        expected = _expected_size(response, resume_from)
+
+        mode = 'ab' if resume_from else 'wb'
+        total_bytes = resume_from
+        with open(part_path, mode) as part_file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    part_file.write(chunk)
+                    hasher.update(chunk)
+                    total_bytes += len(chunk)
+
+    if expected is not None and total_bytes != expected:
+        if total_bytes > expected:
+            os.remove(part_path)  # Cannot be resumed from, start over next time
+        raise IncompleteDownloadError(f'Expected {expected} bytes from {url} but received {total_bytes}')
+
+    os.replace(part_path, dest_path)
+    metrics.observe('download_seconds', time.perf_counter() - start)
+    metrics.increment('files_downloaded')
+    metrics.increment('bytes_downloaded', total_bytes - resume_from)
+    return {'bytes': total_bytes, 'sha256': hasher.hexdigest(), 'resumed': bool(resume_from), 'skipped': False}
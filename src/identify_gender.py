@@ -1,36 +1,291 @@
+import argparse
+import logging
+import math
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
 import librosa
 import numpy as np
+import soundfile as sf
+
+import metrics
+from feature_cache import DEFAULT_MAX_BYTES, evict, load_feature
+from news_table import TABLE_FORMATS, audio_file_paths, read_news_table, write_news_table
+
+logger = logging.getLogger(__name__)
+
+# Pitch tracking only needs the low end of the spectrum, so audio is downsampled first
+TARGET_SR = 8000
+# Quick resampling is plenty accurate for pitch and much cheaper than the default filter
+RES_TYPE = 'soxr_qq'
+# General threshold between male and female average pitch
+FEMALE_PITCH_THRESHOLD = 165
+UNCLASSIFIED = "Unable to classify"
+
+# Streaming mode: length of the decoded blocks and when the running estimate counts as stable
+BLOCK_SECONDS = 10
+MIN_VOICED_FRAMES = 2000
+STABLE_Z_SCORE = 3.0
+
+
+def select_pitches(pitches, magnitudes):
+    """Picks the pitch of the strongest bin in every frame.
 
-def classify_gender(audio_file):
-    # Load the audio file (mp3 supported by librosa)
-    y, sr = librosa.load(audio_file, sr=None)  # sr=None to preserve the original sample rate
-    
-    # Extract the pitch (F0) from the audio
-    pitches, magnitudes = librosa.core.piptrack(y=y, sr=sr)
-    
-    # Extract the fundamental frequencies (F0)
-    pitch_values = []
-    for t in range(pitches.shape[1]):
-        pitch = pitches[:, t]
-        mag = magnitudes[:, t]
-        index = mag.argmax()
-        pitch_value = pitch[index]
-        if pitch_value > 0:
-            pitch_values.append(pitch_value)
-    
-    # Calculate the average pitch
-    if len(pitch_values) == 0:
-        return "Unable to classify"
-    
-    avg_pitch = np.mean(pitch_values)
-    
-    # Set a threshold for male and female (general threshold around 165 Hz)
-    if avg_pitch > 165:  # Female
+    Args:
+        pitches (np.ndarray): Pitch matrix from `librosa.piptrack` (bins x frames).
+        magnitudes (np.ndarray): Magnitude matrix from `librosa.piptrack` (bins x frames).
+
+    Returns:
+        np.ndarray: Fundamental frequency (F0) of the voiced frames.
+    """
+    strongest_bins = magnitudes.argmax(axis=0)
+    pitch_values = pitches[strongest_bins, np.arange(pitches.shape[1])]
+    return pitch_values[pitch_values > 0]
+
+
+def classify_pitch(avg_pitch):
+    """Maps an average pitch to a gender label.
+
+    Args:
+        avg_pitch (float): Average fundamental frequency in Hz.
+
+    Returns:
+        str: "Female" or "Male".
+    """
+    if avg_pitch > FEMALE_PITCH_THRESHOLD:  # Female
         return "Female"
-    else:  # Male
-        return "Male"
+    return "Male"
+
+
+def track_pitch(y, sr):
+    """Returns the fundamental frequency of the voiced frames of mono audio."""
+    pitches, magnitudes = librosa.piptrack(y=np.asarray(y), sr=sr)
+    return select_pitches(pitches, magnitudes)
+
+
+def classify_gender(audio_file, sr=TARGET_SR, cache_dir=None):
+    """Classifies the speaker gender of an audio file from its average pitch.
+
+    Args:
+        audio_file (str): Path of the audio file (mp3 supported by librosa).
+        sr (int): Sample rate the audio is resampled to before pitch tracking.
+        cache_dir (str): Feature cache to read the pitch track from, decoding on a miss.
+
+    Returns:
+        str: "Female", "Male" or "Unable to classify".
+    """
+    if cache_dir:
+        pitch_values = load_feature(cache_dir, audio_file, 'pitch', track_pitch)
+    else:
+        with metrics.timer('decode_seconds'):
+            y, sr = librosa.load(audio_file, sr=sr, mono=True, res_type=RES_TYPE)
+
+        # Extract the pitch (F0) from the audio
+        with metrics.timer('pitch_seconds'):
+            pitch_values = track_pitch(y, sr)
+
+    if pitch_values.size == 0:
+        return UNCLASSIFIED
+    return classify_pitch(pitch_values.mean())
+
+
+def iter_audio_blocks(audio_file, sr=TARGET_SR, block_seconds=BLOCK_SECONDS):
+    """Decodes an audio file block by block as mono audio at `sr`.
+
+    Files libsndfile can read are streamed with `soundfile.blocks` and each block is
+    downmixed and resampled on its own; anything else is decoded through an ffmpeg pipe.
+
+    Args:
+        audio_file (str): Path of the audio file.
+        sr (int): Sample rate of the yielded blocks.
+        block_seconds (int): Approximate length of a block in seconds.
+
+    Yields:
+        np.ndarray: Mono float32 audio block.
+    """
+    try:
+        native_sr = sf.info(audio_file).samplerate
+    except RuntimeError:
+        native_sr = None
+
+    if native_sr:
+        for block in sf.blocks(audio_file, blocksize=block_seconds * native_sr, dtype='float32', always_2d=True):
+            yield librosa.resample(block.mean(axis=1), orig_sr=native_sr, target_sr=sr, res_type=RES_TYPE)
+        return
+
+    block_bytes = block_seconds * sr * 4  # float32 samples
+    command = ['ffmpeg', '-v', 'error', '-i', audio_file, '-f', 'f32le', '-ac', '1', '-ar', str(sr), '-']
+    with subprocess.Popen(command, stdout=subprocess.PIPE) as process:
+        stdout = process.stdout
+        assert stdout is not None  # Always set with stdout=PIPE
+        while True:
+            data = stdout.read(block_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+        stdout.close()
+        if process.wait():
+            raise RuntimeError(f"ffmpeg could not decode {audio_file}")
+
+
+def classify_gender_streaming(audio_file, sr=TARGET_SR, block_seconds=BLOCK_SECONDS):
+    """Classifies the speaker gender while decoding the file block by block.
+
+    Only one block is held in memory at a time. Running pitch statistics are kept
+    across blocks and decoding stops as soon as the average pitch is far enough from
+    the threshold that more audio could not change the label.
+
+    Args:
+        audio_file (str): Path of the audio file.
+        sr (int): Sample rate the audio is resampled to before pitch tracking.
+        block_seconds (int): Approximate length of a block in seconds.
+
+    Returns:
+        str: "Female", "Male" or "Unable to classify".
+    """
+    count = 0
+    mean = 0.0
+    sum_squares = 0.0  # Sum of squared deviations from the running mean
+    start = time.perf_counter()
+    pitch_time = 0.0
+    for block in iter_audio_blocks(audio_file, sr, block_seconds):
+        pitch_start = time.perf_counter()
+        pitches, magnitudes = librosa.piptrack(y=block, sr=sr)
+        pitch_values = select_pitches(pitches, magnitudes)
+        pitch_time += time.perf_counter() - pitch_start
+        if pitch_values.size == 0:
+            continue
+
+        # Merge the block statistics into the running ones (Chan et al.)
+        block_count = pitch_values.size
+        block_mean = float(pitch_values.mean())
+        delta = block_mean - mean
+        total = count + block_count
+        mean += delta * block_count / total
+        sum_squares += float(((pitch_values - block_mean) ** 2).sum()) + delta ** 2 * count * block_count / total
+        count = total
+
+        if count >= MIN_VOICED_FRAMES:
+            standard_error = math.sqrt(sum_squares / (count - 1) / count)
+            if abs(mean - FEMALE_PITCH_THRESHOLD) > STABLE_Z_SCORE * standard_error:
+                break
+
+    metrics.observe('pitch_seconds', pitch_time)
+    metrics.observe('decode_seconds', time.perf_counter() - start - pitch_time)
+    if count == 0:
+        return UNCLASSIFIED
+    return classify_pitch(mean)
+
+
+def classify_gender_safely(audio_file, streaming=False, cache_dir=None):
+    """Classifies one file for the worker pool, turning errors into "Unable to classify".
+
+    With a feature cache the whole pitch track is cached, so streaming does not apply.
+    """
+    try:
+        if cache_dir:
+            return classify_gender(audio_file, cache_dir=cache_dir)
+        if streaming:
+            return classify_gender_streaming(audio_file)
+        return classify_gender(audio_file)
+    except Exception as e:
+        metrics.increment('classification_errors')
+        logger.warning("Error classifying %s: %s", audio_file, e)
+        return UNCLASSIFIED
+
+
+def classify_genders(audio_files, max_workers=None, streaming=False, cache_dir=None, executor=None):
+    """Classifies the speaker gender of many files in parallel.
+
+    Args:
+        audio_files (list): Paths of the audio files.
+        max_workers (int): Number of worker processes, defaults to the number of CPUs.
+        streaming (bool): Decode the files block by block with constant memory.
+        cache_dir (str): Feature cache shared with the other analysis stages, None to decode every file.
+        executor (concurrent.futures.ProcessPoolExecutor): Pool shared with other stages, used
+            instead of starting one.
+
+    Returns:
+        list: Gender label of every file, in the same order.
+    """
+    if not audio_files:
+        return []
+    genders = []
+    with nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=max_workers) as pool:
+        classify = partial(metrics.run_with_metrics, classify_gender_safely, streaming=streaming, cache_dir=cache_dir)
+        for gender, worker_metrics in pool.map(classify, audio_files):
+            genders.append(gender)
+            metrics.merge(worker_metrics)
+    metrics.increment('files_classified', len(genders))
+    return genders
+
+
+def label_speaker_gender(df, data_root_dir='./data', max_workers=None, streaming=False, cache_dir=None,
+                         cache_max_bytes=DEFAULT_MAX_BYTES, executor=None):
+    """Fills the 'Speaker Gender' column from the downloaded audio of every article.
+
+    Rows without a downloaded audio file keep their existing value.
+
+    Args:
+        df (pd.DataFrame): News table.
+        data_root_dir (str): Root data directory holding `<channel>/downloaded_audio`.
+        max_workers (int): Number of worker processes.
+        streaming (bool): Decode the files block by block with constant memory.
+        cache_dir (str): Feature cache shared with the other analysis stages, None to decode every file.
+        cache_max_bytes (int): Size the feature cache is trimmed to afterwards.
+        executor (concurrent.futures.ProcessPoolExecutor): Pool shared with other stages, used
+            instead of starting one.
+
+    Returns:
+        pd.DataFrame: News table with the classified genders.
+    """
+    # Articles linked to the same clip of the audio store resolve to one path and are classified once
+    paths = audio_file_paths(df, data_root_dir, resolve_links=True)
+    has_audio = paths.map(os.path.exists).to_numpy(dtype=bool)
+    unique_audio_files = paths[has_audio].unique().tolist()
+    genders = classify_genders(unique_audio_files, max_workers, streaming, cache_dir, executor)
+    genders = dict(zip(unique_audio_files, genders))
+    if cache_dir:
+        evict(cache_dir, cache_max_bytes)
+
+    labelled_df = df.copy()
+    labelled_df['Speaker Gender'] = labelled_df['Speaker Gender'].astype(object)
+    labelled_df.loc[has_audio, 'Speaker Gender'] = paths[has_audio].map(genders).to_numpy()
+    return labelled_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify the speaker gender of the downloaded news audio.')
+    parser.add_argument('--input', default='./news_data_with_duration.csv', help='Path of the input table.')
+    parser.add_argument('--output', default='./news_data_with_gender.csv', help='Path of the output table.')
+    parser.add_argument('--format', choices=TABLE_FORMATS, default=None,
+                        help='Output format, inferred from the output path when omitted.')
+    parser.add_argument('--data-dir', default='./data', help='Root data directory.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    parser.add_argument('--stream', action='store_true',
+                        help='Decode long broadcasts block by block to keep memory per worker constant.')
+    parser.add_argument('--feature-cache-dir', default=None,
+                        help='Read pitch tracks from the shared feature cache, decoding only files not cached yet.')
+    parser.add_argument('--feature-cache-max-gb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                        help='Size limit of the feature cache; least recently used entries are evicted.')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args)
+
+    df = read_news_table(args.input)
+    with metrics.profile_stage('gender'):
+        labelled_df = label_speaker_gender(
+            df, args.data_dir, args.workers, args.stream,
+            args.feature_cache_dir, int(args.feature_cache_max_gb * 1024 ** 3),
+        )
+    write_news_table(labelled_df, args.output, args.format)
+    logger.info("Labelled news table saved at %s", args.output)
+    metrics.finish(args)
+
 
-# Example usage
-audio_file = "./T082024DK-2.mp3"
-gender = classify_gender(audio_file)
-print(f'The speaker is classified as: {gender}')
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Names passed to `profile_stage` by the stages and the pipeline
+PROFILED_STAGES = ['extract', 'compile', 'download', 'capture', 'duration', 'gender', 'segment']
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, float('inf')]
+
+_lock = threading.Lock()
+_counters: dict = {}
+_histograms: dict = {}
+_profiled_stages: set = set()
+_profile_dir = '.'
+
+
+def increment(name, value=1):
+    """Adds `value` to a counter.
+
+    Args:
+        name (str): Counter name, e.g. 'files_parsed'.
+        value (float): Amount to add.
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    """Records one latency in a histogram.
+
+    Args:
+        name (str): Histogram name, e.g. 'download_seconds'.
+        seconds (float): Observed latency.
+    """
+    with _lock:
+        histogram = _histograms.setdefault(name, {'count': 0, 'sum': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)})
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+        for index, upper_bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= upper_bound:
+                histogram['buckets'][index] += 1
+                break
+
+
+@contextmanager
+def timer(name):
+    """Records the time spent in the block in the `name` histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot():
+    """Returns a copy of all counters and histograms.
+
+    Returns:
+        dict: Counters and histograms.
+    """
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'histograms': {
+                name: dict(histogram, buckets=list(histogram['buckets'])) for name, histogram in _histograms.items()
+            },
+        }
+
+
+def reset():
+    """Clears all counters and histograms."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def merge(other):
+    """Adds the metrics collected elsewhere, e.g. in a worker process, to this process.
+
+    Args:
+        other (dict): Metrics as returned by `snapshot`.
+    """
+    with _lock:
+        for name, value in other['counters'].items():
+            _counters[name] = _counters.get(name, 0) + value
+        for name, histogram in other['histograms'].items():
+            merged = _histograms.setdefault(name, {'count': 0, 'sum': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)})
+            merged['count'] += histogram['count']
+            merged['sum'] += histogram['sum']
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], histogram['buckets'])]
+
+
+def run_with_metrics(func, *args, **kwargs):
+    """Runs `func` in a worker process and returns its result with the metrics it recorded.
+
+    Worker processes are reused across tasks, so the registry is cleared first.
+
+    Returns:
+        tuple: Result of `func` and its metrics snapshot, to be passed to `merge`.
+    """
+    reset()
+    result = func(*args, **kwargs)
+    return result, snapshot()
+
+
+def to_prometheus(metrics):
+    """Formats metrics in the Prometheus text exposition format.
+
+    Args:
+        metrics (dict): Metrics as returned by `snapshot`.
+
+    Returns:
+        str: Prometheus text.
+    """
+    lines = []
+    for name, value in sorted(metrics['counters'].items()):
+        lines.append(f'# TYPE {name}_total counter')
+        lines.append(f'{name}_total {value}')
+    for name, histogram in sorted(metrics['histograms'].items()):
+        lines.append(f'# TYPE {name} histogram')
+        cumulative = 0
+        for upper_bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+            cumulative += count
+            label = '+Inf' if upper_bound == float('inf') else f'{upper_bound:g}'
+            lines.append(f'{name}_bucket{{le="{label}"}} {cumulative}')
+        lines.append(f'{name}_sum {histogram["sum"]}')
+        lines.append(f'{name}_count {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path):
+    """Writes the metrics as Prometheus text (`.prom`/`.txt`) or JSON (any other extension).
+
+    Args:
+        path (str): Output path.
+    """
+    metrics = snapshot()
+    with open(path, 'w', encoding='utf-8') as metrics_file:
+        if path.endswith(('.prom', '.txt')):
+            metrics_file.write(to_prometheus(metrics))
+        else:
+            json.dump(metrics, metrics_file, indent=4)
+
+
+@contextmanager
+def profile_stage(name):
+    """Profiles the block with cProfile if profiling was enabled for stage `name`.
+
+    The profile is written to `<profile dir>/<name>.prof` for `pstats` or snakeviz.
+    cProfile only sees the thread that enters the block, not worker threads or processes.
+    """
+    if name not in _profiled_stages:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(_profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(_profile_dir, f'{name}.prof'))
+
+
+def add_arguments(parser):
+    """Adds the logging, metrics and profiling options to a stage's argument parser."""
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Logging level; per-item messages are logged at DEBUG.')
+    parser.add_argument('--metrics-path', default=None,
+                        help='Write metrics at the end of the run (.prom/.txt for Prometheus text, else JSON).')
+    parser.add_argument('--profile-stage', nargs='*', default=[], choices=PROFILED_STAGES,
+                        help='Stages to profile with cProfile. Only the calling thread is profiled: time spent '
+                             'in download or capture threads and in worker processes shows up as waiting.')
+    parser.add_argument('--profile-dir', default='./profiles', help='Directory of the cProfile output.')
+
+
+def setup(args):
+    """Configures logging and profiling from the options added by `add_arguments`."""
+    global _profile_dir
+    logging.basicConfig(level=args.log_level, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    _profiled_stages.update(args.profile_stage)
+    _profile_dir = args.profile_dir
+
+
+def finish(args):
+    """Writes the metrics file requested on the command line, if any."""
+    if args.metrics_path:
+        write_metrics(args.metrics_path)
+        logging.getLogger(__name__).info('Metrics written to %s', args.metrics_path)
@@ -0,0 +1,220 @@
+import mmap
+import os
+import struct
+
+# Bitrates in kbps indexed by [version is MPEG-1][layer][bitrate index]
+BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+
+# Sample rates indexed by the version bits of the frame header
+SAMPLE_RATES = {
+    0: [11025, 12000, 8000],  # MPEG-2.5
+    2: [22050, 24000, 16000],  # MPEG-2
+    3: [44100, 48000, 32000],  # MPEG-1
+}
+
+HEADER_READ_SIZE = 4096
+CBR_CHECK_FRAMES = 4
+
+
+def parse_frame_header(header):
+    """Parses a 4-byte MPEG audio frame header.
+
+    Args:
+        header (bytes): The four header bytes.
+
+    Returns:
+        dict: Frame properties, or None if the bytes are not a valid frame header.
+    """
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version_bits == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None  # Reserved values or free-format bitrate
+
+    is_mpeg1 = version_bits == 3
+    bitrate = BITRATES[is_mpeg1][layer][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    mono = (header[3] >> 6) == 3
+
+    if layer == 1:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or is_mpeg1:
+        samples_per_frame = 1152
+        frame_length = 144 * bitrate // sample_rate + padding
+    else:
+        samples_per_frame = 576
+        frame_length = 72 * bitrate // sample_rate + padding
+
+    return {
+        'is_mpeg1': is_mpeg1,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'mono': mono,
+        'samples_per_frame': samples_per_frame,
+        'frame_length': frame_length,
+    }
+
+
+def id3v2_size(header):
+    """Returns the size of the ID3v2 tag at the start of the file, 0 if there is none.
+
+    Args:
+        header (bytes): The first 10 bytes of the file.
+
+    Returns:
+        int: Tag size in bytes including its header and footer.
+    """
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_first_frame(data, offset=0):
+    """Finds the first frame header that is followed by another valid frame header.
+
+    Args:
+        data (bytes): Bytes to search.
+        offset (int): Position to start searching from.
+
+    Returns:
+        tuple: Position of the frame and its parsed header, or (None, None).
+    """
+    position = data.find(b'\xff', offset)
+    while position != -1 and position + 4 <= len(data):
+        frame = parse_frame_header(data[position:position + 4])
+        if frame:
+            next_position = position + frame['frame_length']
+            if next_position + 4 > len(data) or parse_frame_header(data[next_position:next_position + 4]):
+                return position, frame
+        position = data.find(b'\xff', position + 1)
+    return None, None
+
+
+def read_vbr_frame_count(data, position, frame):
+    """Reads the total frame count from a Xing/Info or VBRI header in the first frame.
+
+    Args:
+        data (bytes): Bytes holding the first frame.
+        position (int): Position of the first frame in `data`.
+        frame (dict): Parsed header of the first frame.
+
+    Returns:
+        int: Number of frames, or None if there is no such header.
+    """
+    if frame['is_mpeg1']:
+        xing_offset = 21 if frame['mono'] else 36
+    else:
+        xing_offset = 13 if frame['mono'] else 21
+    xing = position + xing_offset
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        if flags & 0x01:
+            return struct.unpack('>I', data[xing + 8:xing + 12])[0]
+
+    vbri = position + 36
+    if data[vbri:vbri + 4] == b'VBRI':
+        return struct.unpack('>I', data[vbri + 14:vbri + 18])[0]
+    return None
+
+
+def is_constant_bitrate(data, position, frame):
+    """Checks whether the first few frames all share the bitrate of the first one.
+
+    At least one frame after the first must fit in `data`; a single frame says nothing
+    about the bitrate of the rest, so the caller falls back to scanning the file.
+    """
+    compared = 0
+    for _ in range(CBR_CHECK_FRAMES):
+        position += frame['frame_length']
+        if position + 4 > len(data):
+            break
+        next_frame = parse_frame_header(data[position:position + 4])
+        if not next_frame or next_frame['bitrate'] != frame['bitrate']:
+            return False
+        frame = next_frame
+        compared += 1
+    return compared > 0
+
+
+def scan_frames(file_path, audio_start):
+    """Walks every frame header of the file and adds up the samples.
+
+    Args:
+        file_path (str): Path of the MP3 file.
+        audio_start (int): Offset of the first frame.
+
+    Returns:
+        float: Duration in seconds.
+    """
+    samples = 0
+    sample_rate = None
+    with open(file_path, 'rb') as mp3_file, mmap.mmap(mp3_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        position = audio_start
+        while position + 4 <= len(data):
+            frame = parse_frame_header(data[position:position + 4])
+            if not frame:
+                position, frame = find_first_frame(data, position + 1)
+                if frame is None:
+                    break
+            samples += frame['samples_per_frame']
+            sample_rate = frame['sample_rate']
+            position += frame['frame_length']
+    if not sample_rate:
+        raise ValueError(f'No MPEG audio frames found in {file_path}')
+    return samples / sample_rate
+
+
+def probe_mp3_duration(file_path):
+    """Returns the duration of an MP3 file in seconds, reading only its headers when possible.
+
+    The duration comes from the Xing/Info or VBRI frame count when present, from the
+    file size when the first frames show a constant bitrate, and otherwise from a scan
+    over every frame header.
+
+    Args:
+        file_path (str): Path of the MP3 file.
+
+    Returns:
+        float: Duration in seconds.
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as mp3_file:
+        audio_start = id3v2_size(mp3_file.read(10))
+        mp3_file.seek(audio_start)
+        data = mp3_file.read(HEADER_READ_SIZE)
+        mp3_file.seek(max(file_size - 128, 0))
+        has_id3v1 = mp3_file.read(3) == b'TAG'
+
+    position, frame = find_first_frame(data)
+    if frame is None:
+        return scan_frames(file_path, audio_start)
+    audio_start += position
+
+    frame_count = read_vbr_frame_count(data, position, frame)
+    if frame_count:
+        return frame_count * frame['samples_per_frame'] / frame['sample_rate']
+
+    if is_constant_bitrate(data, position, frame):
+        audio_bytes = file_size - audio_start - (128 if has_id3v1 else 0)
+        return audio_bytes * 8 / frame['bitrate']
+
+    return scan_frames(file_path, audio_start)
@@ -0,0 +1,143 @@
+import logging
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq  # Optional: needed for the Parquet format
+except ImportError:
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+TABLE_FORMATS = ['csv', 'parquet']
+
+
+def infer_table_format(path):
+    """Infers the table format from the file extension, treating directories as partitioned Parquet.
+
+    Args:
+        path (str): Path of the table.
+
+    Returns:
+        str: 'csv' or 'parquet'.
+    """
+    if os.path.isdir(path) or path.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    return 'csv'
+
+
+def duration_to_seconds(durations):
+    """Converts a duration column to float seconds.
+
+    Numbers are kept as they are, 'HH:MM:SS' strings are parsed and anything else
+    (e.g. 'Duration not found') becomes NaN.
+
+    Args:
+        durations (pd.Series): Duration column.
+
+    Returns:
+        pd.Series: Durations in seconds.
+    """
+    seconds = pd.to_numeric(durations, errors='coerce')
+    as_text = durations.where(seconds.isna()).astype('string')
+    clock = as_text.str.fullmatch(r'\d+:\d{2}:\d{2}(\.\d+)?').fillna(False).astype(bool)
+    seconds[clock] = pd.to_timedelta(as_text[clock]).dt.total_seconds()
+    return seconds.astype('float64')
+
+
+def to_typed_columns(df):
+    """Converts the news table columns to proper types for columnar storage.
+
+    Args:
+        df (pd.DataFrame): News table with string columns as produced by the CSV stages.
+
+    Returns:
+        pd.DataFrame: Copy of the table with typed columns.
+    """
+    df = df.copy()
+    for column in ['ID', 'Audio URL', 'Audio Text', 'Speaker Name']:
+        if column in df:
+            df[column] = df[column].astype('string')
+    for column in ['Speaker Gender', 'News Channel']:
+        if column in df:
+            df[column] = df[column].astype('category')
+    if 'Publishing Year' in df:
+        # Every value is parsed on its own since the formats differ between news houses;
+        # offsets are converted to UTC so that mixed time zones do not abort the conversion
+        dates = pd.to_datetime(df['Publishing Year'], errors='coerce', format='mixed', utc=True).dt.tz_convert(None)
+        coerced = int((dates.isna() & df['Publishing Year'].notna() & (df['Publishing Year'] != '')).sum())
+        if coerced:
+            logger.warning("%d 'Publishing Year' values are not dates and were stored as missing.", coerced)
+        df['Publishing Year'] = dates
+    if 'Audio Duration' in df:
+        df['Audio Duration'] = duration_to_seconds(df['Audio Duration'])
+    return df
+
+
+def audio_file_paths(df, data_root_dir, resolve_links=False):
+    """Builds the path of every article's downloaded audio, `<data_root_dir>/<channel>/downloaded_audio/<ID>.mp3`.
+
+    The paths are assembled column-wise from one prefix per channel. With
+    `resolve_links`, the per-channel directories are resolved once and only files that
+    are symlinks (e.g. links into the audio store) are resolved individually, so that
+    articles sharing a clip end up with the same path.
+
+    Args:
+        df (pd.DataFrame): News table with 'ID' and 'News Channel' columns.
+        data_root_dir (str): Root data directory.
+        resolve_links (bool): Return canonical paths instead of the per-article ones.
+
+    Returns:
+        pd.Series: Audio path per row, aligned with `df`.
+    """
+    channels = df['News Channel'].astype(str)
+    prefixes = {channel: os.path.join(data_root_dir, channel, 'downloaded_audio', '') for channel in channels.unique()}
+    if resolve_links:
+        prefixes = {channel: os.path.join(os.path.realpath(prefix), '') for channel, prefix in prefixes.items()}
+    paths = channels.map(prefixes) + df['ID'].astype(str) + '.mp3'
+    if resolve_links:
+        links = paths.map(os.path.islink)
+        paths[links] = paths[links].map(os.path.realpath)
+    return paths
+
+
+def write_news_table(df, path, table_format=None, partition_by_channel=False):
+    """Saves the news table as CSV or Parquet.
+
+    Args:
+        df (pd.DataFrame): News table.
+        path (str): Output path; a directory when partitioning by channel.
+        table_format (str): 'csv' or 'parquet', inferred from `path` when omitted.
+        partition_by_channel (bool): Write one Parquet partition per news channel.
+    """
+    table_format = table_format or infer_table_format(path)
+    if table_format == 'csv':
+        df.to_csv(path, index=False, encoding='utf-8')
+        return
+    if pq is None:
+        raise ImportError('pyarrow is required to write Parquet tables')
+    partition_cols = ['News Channel'] if partition_by_channel else None
+    to_typed_columns(df).to_parquet(path, engine='pyarrow', index=False, partition_cols=partition_cols)
+
+
+def read_news_table(path, columns=None, table_format=None):
+    """Loads the news table, reading only the requested columns.
+
+    Parquet tables are memory mapped, so skipped columns such as the transcripts are
+    never read from disk.
+
+    Args:
+        path (str): Path of the table.
+        columns (list): Columns to load, all of them when omitted.
+        table_format (str): 'csv' or 'parquet', inferred from `path` when omitted.
+
+    Returns:
+        pd.DataFrame: News table.
+    """
+    table_format = table_format or infer_table_format(path)
+    if table_format == 'csv':
+        return pd.read_csv(path, usecols=columns)
+    if pq is None:
+        raise ImportError('pyarrow is required to read Parquet tables')
+    return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
@@ -0,0 +1,284 @@
+import argparse
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+import metrics
+from article_store import STORAGE_BACKENDS, article_store_path
+from audio_download import download_rfa_audio
+from compile_news_metadata import compile_news_metadata_incremental, save_news_metadata
+from extract_news_audio import NEWS_HOUSES, run_pipeline
+from feature_cache import DEFAULT_MAX_BYTES
+from get_audio_duration import add_audio_duration
+from http_download import create_session
+from identify_gender import label_speaker_gender
+from news_table import TABLE_FORMATS, read_news_table, write_news_table
+from segment_audio import segment_articles
+from stream_capture import find_stream_jobs, run_capture_jobs
+
+logger = logging.getLogger(__name__)
+
+# A stage is stale when it has no stamp, an output is missing, an input is newer than
+# its stamp or a stage it depends on runs. `run` returns False when the stage finished
+# with failed items, so that it is not stamped and runs again next time.
+Stage = namedtuple('Stage', ['name', 'deps', 'inputs', 'outputs', 'run'])
+
+STAGE_NAMES = ['extract', 'compile', 'download', 'capture', 'duration', 'gender', 'segment']
+# News houses whose audio (HLS streams and plain MP3s) is captured with ffmpeg instead of downloaded over HTTP
+STREAM_NEWS_HOUSES = ['VOA', 'VOT']
+
+
+def newest_mtime(path):
+    """Returns the newest mtime in nanoseconds of a file or of anything below a directory, None if missing."""
+    try:
+        newest = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if not os.path.isdir(path):
+        return newest
+    directories = [path]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                newest = max(newest, entry.stat(follow_symlinks=False).st_mtime_ns)
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+    return newest
+
+
+def stamp_path(stamp_dir, name):
+    return os.path.join(stamp_dir, f'{name}.json')
+
+
+def is_fresh(stage, stamp_dir):
+    """Checks whether a stage's outputs are up to date with its inputs.
+
+    Args:
+        stage (Stage): Stage to check.
+        stamp_dir (str): Directory of the stamps written after every successful stage.
+
+    Returns:
+        bool: True if the stage can be skipped.
+    """
+    stamp_mtime = newest_mtime(stamp_path(stamp_dir, stage.name))
+    if stamp_mtime is None or any(not os.path.exists(output) for output in stage.outputs):
+        return False
+    return all((newest_mtime(path) or 0) <= stamp_mtime for path in stage.inputs)
+
+
+def plan_stages(stages, targets, stamp_dir, force=()):
+    """Lists the stages to run, in dependency order, to bring the targets up to date.
+
+    Args:
+        stages (dict): Stages by name.
+        targets (list): Names of the stages whose outputs are wanted.
+        stamp_dir (str): Directory of the stage stamps.
+        force (iterable): Names of stages to run even if they are fresh.
+
+    Returns:
+        list: Names of the stale stages in the order they must run.
+    """
+    needed = []
+
+    def visit(name):
+        for dep in stages[name].deps:
+            visit(dep)
+        if name not in needed:
+            needed.append(name)
+
+    for target in targets:
+        visit(target)
+
+    stale = []
+    for name in needed:
+        stage = stages[name]
+        if name in force or any(dep in stale for dep in stage.deps) or not is_fresh(stage, stamp_dir):
+            stale.append(name)
+    return stale
+
+
+def build_stages(args, context):
+    """Declares the pipeline stages with their inputs and outputs for the given options.
+
+    Args:
+        args (argparse.Namespace): Pipeline options.
+        context (dict): State shared by the stages of one run: the worker pool, the HTTP
+            session and the downloads started while extracting.
+
+    Returns:
+        dict: Stages by name, in dependency order.
+    """
+    extension = 'parquet' if args.format == 'parquet' else 'csv'
+    news_table = os.path.join(args.work_dir, f'news_data.{extension}')
+    duration_table = os.path.join(args.work_dir, f'news_data_with_duration.{extension}')
+    gender_table = os.path.join(args.work_dir, f'news_data_with_gender.{extension}')
+    rfa_audio_dir = os.path.join(args.data_dir, 'RFA', 'downloaded_audio')
+    download_manifest = os.path.join(rfa_audio_dir, 'manifest.jsonl')
+    capture_queue = os.path.join(args.data_dir, 'stream_capture_queue.json')
+    clips_dir = args.clips_dir or os.path.join(args.work_dir, 'clips')
+
+    def download(df):
+        return download_rfa_audio(
+            df, rfa_audio_dir, context['session'], args.download_workers, store_dir=args.store_dir
+        )
+
+    def prefetch(news_house, articles):
+        # Downloads start as soon as a dump's articles are extracted instead of after compiling
+        if news_house == 'RFA':
+            df = pd.DataFrame(articles, columns=['ID', 'Audio URL']).assign(**{'News Channel': 'RFA'})
+            context['prefetches'].append(context['download_lane'].submit(download, df))
+
+    def run_extract():
+        on_saved = prefetch if context.get('download_lane') else None
+        summary = run_pipeline(args.news_houses, args.data_dir, args.workers, executor=context['executor'],
+                               on_saved=on_saved, storage=args.storage)
+        for news_house, counts in summary.items():
+            logger.info("%s: %d of %d articles have audio", news_house, counts['saved'], counts['read'])
+
+    def run_compile():
+        index_path = os.path.join(args.work_dir, 'news_metadata_index.sqlite')
+        rows = compile_news_metadata_incremental(args.data_dir, args.news_houses, index_path)
+        save_news_metadata(rows, news_table, args.format)
+
+    def run_download():
+        for future in context['prefetches']:
+            future.result()
+        # A full pass over the table catches anything the prefetch missed; finished IDs are skipped
+        summary = download(read_news_table(news_table, columns=['ID', 'Audio URL', 'News Channel']))
+        logger.info("RFA downloads: %d done, %d failed, %d dead, %d skipped.", summary['done'], summary['failed'],
+                    summary['dead'], summary['skipped'])
+        # Dead links will not come back, only retryable failures keep the stage from being stamped
+        return summary['failed'] == 0
+
+    def run_capture():
+        news_houses = [house for house in args.news_houses if house in STREAM_NEWS_HOUSES]
+        summary = run_capture_jobs(find_stream_jobs(args.data_dir, news_houses), capture_queue, args.capture_workers,
+                                   store_dir=args.store_dir)
+        return summary['failed'] == 0  # Dead streams do not keep the stage from being stamped
+
+    def run_duration():
+        cache_path = os.path.join(args.work_dir, 'audio_duration_cache.sqlite')
+        df = add_audio_duration(read_news_table(news_table), args.data_dir, cache_path, args.workers,
+                                args.feature_cache_dir, context['executor'], args.feature_cache_max_bytes)
+        write_news_table(df, duration_table, args.format)
+
+    def run_gender():
+        df = label_speaker_gender(read_news_table(duration_table), args.data_dir, args.workers,
+                                  cache_dir=args.feature_cache_dir, cache_max_bytes=args.feature_cache_max_bytes,
+                                  executor=context['executor'])
+        write_news_table(df, gender_table, args.format)
+
+    def run_segment():
+        df = read_news_table(news_table, columns=['ID', 'News Channel'])
+        segment_articles(df, args.data_dir, clips_dir, args.workers, context['executor'])
+
+    dumps = [os.path.join(args.data_dir, house, 'news_dataset') for house in args.news_houses]
+    article_dirs = [os.path.join(args.data_dir, house, 'news_dataset_with_audio') for house in args.news_houses]
+    article_stores = [article_store_path(args.data_dir, house) for house in args.news_houses]
+    # Extraction writes one of the two, but the compiler and capture read both
+    extracted = article_stores if args.storage == 'sqlite' else article_dirs
+    articles = article_dirs + article_stores
+    stages = [
+        Stage('extract', [], dumps, extracted, run_extract),
+        Stage('compile', ['extract'], articles, [news_table], run_compile),
+        Stage('download', ['compile'], [news_table], [download_manifest], run_download),
+        Stage('capture', ['compile'], articles, [capture_queue], run_capture),
+        Stage('duration', ['download', 'capture'], [news_table, download_manifest, capture_queue], [duration_table],
+              run_duration),
+        Stage('gender', ['duration'], [duration_table, download_manifest, capture_queue], [gender_table], run_gender),
+        Stage('segment', ['download', 'capture'], [news_table, download_manifest, capture_queue],
+              [os.path.join(clips_dir, 'clips_manifest.jsonl')], run_segment),
+    ]
+    return {stage.name: stage for stage in stages}
+
+
+def run_stages(args):
+    """Runs the stale stages needed for the requested targets.
+
+    All CPU-bound stages share one process pool. When both extraction and download are
+    stale, RFA downloads run on a background thread while the dumps are still being
+    extracted. A stage that reports failed items, and every stage run after it on its
+    outputs, is left without a stamp so that the next run retries it.
+
+    Args:
+        args (argparse.Namespace): Pipeline options.
+
+    Returns:
+        list: Names of the stages that ran.
+    """
+    stamp_dir = os.path.join(args.work_dir, '.pipeline')
+    os.makedirs(stamp_dir, exist_ok=True)
+    context: dict = {'executor': None, 'session': None, 'download_lane': None, 'prefetches': []}
+    stages = build_stages(args, context)
+    force = STAGE_NAMES if 'all' in args.force else args.force
+    stale = plan_stages(stages, args.targets, stamp_dir, force)
+    logger.info("Stages to run: %s", ', '.join(stale) or 'none, everything is up to date')
+    if args.dry_run or not stale:
+        return []
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor, ThreadPoolExecutor(max_workers=1) as lane:
+        context['executor'] = executor
+        context['session'] = create_session(args.download_workers)
+        if 'extract' in stale and 'download' in stale:
+            context['download_lane'] = lane
+        incomplete = set()
+        for name in stale:
+            # The old stamp goes first so that a stage that raises or fails items is stale next time
+            if os.path.exists(stamp_path(stamp_dir, name)):
+                os.remove(stamp_path(stamp_dir, name))
+            start = time.perf_counter()
+            with metrics.profile_stage(name), metrics.timer(f'stage_{name}_seconds'):
+                complete = stages[name].run() is not False
+            seconds = time.perf_counter() - start
+            if not complete or any(dep in incomplete for dep in stages[name].deps):
+                incomplete.add(name)
+                logger.warning("Stage %s finished in %.1f s but had failures or ran on incomplete inputs; "
+                               "it will run again next time.", name, seconds)
+                continue
+            with open(stamp_path(stamp_dir, name), 'w', encoding='utf-8') as stamp_file:
+                json.dump({'stage': name, 'seconds': seconds, 'finished_at': time.time()}, stamp_file)
+            logger.info("Stage %s finished in %.1f s.", name, seconds)
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the news audio pipeline, skipping stages that are up to date.')
+    parser.add_argument('--targets', nargs='+', default=['gender'], choices=STAGE_NAMES,
+                        help='Stages whose outputs are wanted; the stages they depend on run first if stale.')
+    parser.add_argument('--force', nargs='*', default=[], choices=STAGE_NAMES + ['all'],
+                        help='Stages to run even if they are up to date.')
+    parser.add_argument('--dry-run', action='store_true', help='Only list the stages that would run.')
+    parser.add_argument('--data-dir', default='./data', help='Root data directory.')
+    parser.add_argument('--work-dir', default='./pipeline_output', help='Directory of the tables and stage stamps.')
+    parser.add_argument('--clips-dir', default=None, help='Directory of the clips, defaults to <work-dir>/clips.')
+    parser.add_argument('--news-houses', nargs='+', default=NEWS_HOUSES, choices=NEWS_HOUSES,
+                        help='News houses to process.')
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, default='files',
+                        help="'files' extracts a directory per article, 'sqlite' one packed store per news house.")
+    parser.add_argument('--format', choices=TABLE_FORMATS, default='csv', help='Format of the tables.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Size of the process pool shared by the stages.')
+    parser.add_argument('--download-workers', type=int, default=8, help='Number of concurrent downloads.')
+    parser.add_argument('--capture-workers', type=int, default=4, help='Number of parallel ffmpeg stream captures.')
+    parser.add_argument('--store-dir', default=None,
+                        help='Content-addressed audio store for the downloads and captures.')
+    parser.add_argument('--feature-cache-dir', default=None, help='Shared audio feature cache for the analysis stages.')
+    parser.add_argument('--feature-cache-max-gb', type=float, default=DEFAULT_MAX_BYTES / 1024 ** 3,
+                        help='Size limit of the feature cache.')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    args.feature_cache_max_bytes = int(args.feature_cache_max_gb * 1024 ** 3)
+    metrics.setup(args)
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    run_stages(args)
+    metrics.finish(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+import metrics
+from http_download import IncompleteDownloadError, download_file
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Connection drops, timeouts and truncated bodies
+RETRYABLE_ERRORS = (
+    requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError, IncompleteDownloadError,
+)
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst` requests."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per host so that every server gets its own request budget."""
+
+    def __init__(self, rate_per_host, burst=1):
+        self.rate_per_host = rate_per_host
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        """Blocks until a request to the host of `url` is allowed."""
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.setdefault(host, TokenBucket(self.rate_per_host, self.burst))
+        bucket.acquire()
+
+
+class AdaptiveConcurrency:
+    """Limits requests in flight, growing the limit on success and halving it on throttling.
+
+    The limit increases by one after `increase_after` consecutive successes (additive
+    increase) and is halved whenever a request is throttled or fails with a server
+    error (multiplicative decrease), converging on the highest sustainable concurrency.
+    Requests failing for reasons unrelated to load, such as a 404, are released as
+    neutral and leave the limit alone.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=None, increase_after=20):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.increase_after = increase_after
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False, neutral=False):
+        with self.condition:
+            self.in_flight -= 1
+            if neutral:
+                pass
+            elif throttled:
+                self.successes = 0
+                self.limit = max(self.minimum, self.limit // 2)
+                metrics.increment('concurrency_decreases')
+            else:
+                self.successes += 1
+                if self.successes >= self.increase_after and self.limit < self.maximum:
+                    self.successes = 0
+                    self.limit += 1
+            self.condition.notify_all()
+
+
+def parse_retry_after(value):
+    """Converts a Retry-After header (seconds or an HTTP date) to seconds, None if absent or invalid."""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def is_retryable(error):
+    """Tells whether a failed download may succeed when it is tried again later."""
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def backoff_delay(attempt, base=1.0, maximum=60.0):
+    """Returns a full-jitter exponential backoff delay for the given attempt (1-based)."""
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+
+def fetch_with_retry(session, url, dest_path, rate_limiter, concurrency, headers=None, retries=5,
+                     backoff_base=1.0, max_backoff=60.0, **download_kwargs):
+    """Downloads a file through the per-host rate limit, retrying throttled and transient failures.
+
+    429 and 5xx responses, connection errors, timeouts and truncated bodies are retried
+    with jittered exponential backoff, waiting at least as long as the server's
+    Retry-After. Other HTTP errors are raised immediately.
+
+    Args:
+        session (requests.Session): Session object for making requests.
+        url (str): URL of the file.
+        dest_path (str): Destination path of the file.
+        rate_limiter (HostRateLimiter): Per-host request budget.
+        concurrency (AdaptiveConcurrency): Limit of requests in flight.
+        headers (dict): Extra headers for this request.
+        retries (int): Number of attempts before giving up.
+        backoff_base (float): Upper bound in seconds of the first backoff delay.
+        max_backoff (float): Upper bound in seconds of any backoff delay.
+        **download_kwargs: Passed on to `download_file`.
+
+    Returns:
+        dict: Download result of `download_file`.
+
+    Raises:
+        ValueError: If `retries` is less than one.
+    """
+    if retries < 1:
+        raise ValueError(f'retries must be at least 1, got {retries}')
+    for attempt in range(1, retries + 1):
+        rate_limiter.acquire(url)
+        concurrency.acquire()
+        throttled = succeeded = False
+        try:
+            result = download_file(session, url, dest_path, headers=headers, **download_kwargs)
+            succeeded = True
+            return result
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code not in RETRYABLE_STATUS_CODES:
+                raise
+            throttled = True
+            if attempt == retries:
+                raise
+            metrics.increment(f'http_{e.response.status_code}')
+            retry_after = parse_retry_after(e.response.headers.get('Retry-After'))
+        except RETRYABLE_ERRORS:
+            throttled = True
+            if attempt == retries:
+                raise
+            metrics.increment('transient_errors')
+            retry_after = None
+        finally:
+            concurrency.release(throttled, neutral=not (throttled or succeeded))
+        metrics.increment('retries')
+        time.sleep(max(retry_after or 0.0, backoff_delay(attempt, backoff_base, max_backoff)))
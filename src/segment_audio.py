@@ -0,0 +1,249 @@
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+import metrics
+from news_table import audio_file_paths, read_news_table
+
+logger = logging.getLogger(__name__)
+
+# ASR corpora are usually 16 kHz mono
+SEGMENT_SR = 16000
+CLIP_FORMATS = ['wav', 'flac', 'ogg']
+
+# Energy is measured on 25 ms frames every 10 ms
+FRAME_SECONDS = 0.025
+HOP_SECONDS = 0.010
+# Frames this far below the loudest frame count as silence
+SILENCE_DB = -40.0
+MIN_SILENCE_SECONDS = 0.3
+MIN_CLIP_SECONDS = 1.0
+MAX_CLIP_SECONDS = 20.0
+# Silence kept around each clip so that words are not cut off
+PAD_SECONDS = 0.1
+
+ARTICLE_MANIFEST = 'clips.jsonl'
+
+
+def frame_rms(samples, frame_length, hop_length):
+    """Computes the RMS energy of every frame from a running sum of squares.
+
+    Args:
+        samples (np.ndarray): Mono audio.
+        frame_length (int): Frame length in samples.
+        hop_length (int): Distance between frame starts in samples.
+
+    Returns:
+        np.ndarray: RMS energy per frame.
+    """
+    if samples.size < frame_length:
+        samples = np.pad(samples, (0, frame_length - samples.size))
+    cumulative = np.concatenate(([0.0], np.cumsum(np.square(samples, dtype=np.float64))))
+    starts = np.arange(0, samples.size - frame_length + 1, hop_length)
+    energy = (cumulative[starts + frame_length] - cumulative[starts]) / frame_length
+    return np.sqrt(np.maximum(energy, 0.0))
+
+
+def find_segments(samples, sr, silence_db=SILENCE_DB, min_silence_seconds=MIN_SILENCE_SECONDS,
+                  min_clip_seconds=MIN_CLIP_SECONDS, max_clip_seconds=MAX_CLIP_SECONDS, pad_seconds=PAD_SECONDS):
+    """Splits audio into speech segments at silences.
+
+    Frames quieter than `silence_db` below the loudest frame are silent. Voiced runs
+    separated by less than `min_silence_seconds` are merged, segments longer than
+    `max_clip_seconds` are cut into equal parts and segments shorter than
+    `min_clip_seconds` are dropped.
+
+    Args:
+        samples (np.ndarray): Mono audio.
+        sr (int): Sample rate of the audio.
+        silence_db (float): Silence threshold relative to the loudest frame.
+        min_silence_seconds (float): Shortest pause that separates two segments.
+        min_clip_seconds (float): Shortest segment kept.
+        max_clip_seconds (float): Longest segment before it is cut.
+        pad_seconds (float): Audio kept before and after every segment.
+
+    Returns:
+        np.ndarray: Start and end sample of every segment, shape (segments, 2).
+    """
+    frame_length = int(FRAME_SECONDS * sr)
+    hop_length = int(HOP_SECONDS * sr)
+    rms = frame_rms(samples, frame_length, hop_length)
+    peak = rms.max() if rms.size else 0.0
+    if peak <= 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    voiced = 20 * np.log10(np.maximum(rms, 1e-10) / peak) > silence_db
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+
+    # Merge voiced runs separated by short pauses
+    splits = np.flatnonzero(run_starts[1:] - run_ends[:-1] >= min_silence_seconds / HOP_SECONDS)
+    starts = run_starts[np.concatenate(([0], splits + 1))] * hop_length
+    last_frames = run_ends[np.concatenate((splits, [run_ends.size - 1]))] - 1
+    # The frames stop short of the end of the audio; a segment reaching the last frame runs to the end
+    ends = np.where(last_frames == rms.size - 1, samples.size, last_frames * hop_length + frame_length)
+
+    # Cut long segments into equal parts
+    max_length = int(max_clip_seconds * sr)
+    parts = np.maximum(1, np.ceil((ends - starts) / max_length).astype(np.int64))
+    part_index = np.arange(parts.sum()) - np.repeat(np.cumsum(parts) - parts, parts)
+    part_length = np.repeat((ends - starts) / parts, parts)
+    starts = np.repeat(starts, parts) + (part_index * part_length).astype(np.int64)
+    ends = np.minimum(starts + np.ceil(part_length).astype(np.int64), np.repeat(ends, parts))
+
+    keep = ends - starts >= int(min_clip_seconds * sr)
+    pad = int(pad_seconds * sr)
+    starts = np.maximum(starts[keep] - pad, 0)
+    ends = np.minimum(ends[keep] + pad, samples.size)
+    return np.stack([starts, ends], axis=1)
+
+
+def segment_article(audio_file, article_id, news_channel, clips_dir, sr=SEGMENT_SR, clip_format='wav',
+                    **segment_options):
+    """Decodes an article's audio once and writes one clip per speech segment.
+
+    The clips and a per-article manifest go to `<clips_dir>/<channel>/<ID>/`. The
+    manifest is written last, atomically, and marks the article as done.
+
+    Args:
+        audio_file (str): Path of the article audio.
+        article_id (str): ID of the article.
+        news_channel (str): News channel of the article.
+        clips_dir (str): Root directory of the clips.
+        sr (int): Sample rate of the clips.
+        clip_format (str): One of `CLIP_FORMATS`.
+        **segment_options: Passed on to `find_segments`.
+
+    Returns:
+        list: Manifest entry of every clip.
+    """
+    article_dir = os.path.join(clips_dir, news_channel, article_id)
+    os.makedirs(article_dir, exist_ok=True)
+    with metrics.timer('decode_seconds'):
+        samples, _ = librosa.load(audio_file, sr=sr, mono=True)
+    with metrics.timer('segment_seconds'):
+        segments = find_segments(samples, sr, **segment_options)
+
+    entries = []
+    for index, (start, end) in enumerate(segments):
+        clip_path = os.path.join(article_dir, f'{article_id}_{index:04d}.{clip_format}')
+        sf.write(clip_path, samples[start:end], sr, format=clip_format.upper())
+        entries.append({
+            'id': article_id,
+            'channel': news_channel,
+            'clip': index,
+            'path': clip_path,
+            'offset': round(start / sr, 3),
+            'duration': round((end - start) / sr, 3),
+            'sample_rate': sr,
+        })
+
+    manifest_path = os.path.join(article_dir, ARTICLE_MANIFEST)
+    with open(manifest_path + '.part', 'w', encoding='utf-8') as manifest_file:
+        for entry in entries:
+            manifest_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    os.replace(manifest_path + '.part', manifest_path)
+    metrics.increment('clips_written', len(entries))
+    return entries
+
+
+def segment_article_safely(job, **options):
+    """Segments one article for the worker pool, logging failures instead of raising."""
+    audio_file, article_id, news_channel = job
+    try:
+        return segment_article(audio_file, article_id, news_channel, **options)
+    except Exception as e:
+        metrics.increment('segmentation_errors')
+        logger.warning("Error segmenting %s: %s", audio_file, e)
+        return []
+
+
+def segment_articles(df, data_root_dir, clips_dir, max_workers=None, executor=None, **options):
+    """Segments the downloaded audio of every article in parallel and writes the clip manifest.
+
+    Articles that already have a per-article manifest are skipped, so an interrupted
+    run resumes where it stopped. `<clips_dir>/clips_manifest.jsonl` is rebuilt from the
+    per-article manifests at the end.
+
+    Args:
+        df (pd.DataFrame): News table.
+        data_root_dir (str): Root data directory holding `<channel>/downloaded_audio`.
+        clips_dir (str): Root directory of the clips.
+        max_workers (int): Number of worker processes.
+        executor (concurrent.futures.ProcessPoolExecutor): Pool shared with other stages, used
+            instead of starting one.
+        **options: Passed on to `segment_article`, e.g. `sr` and `clip_format`.
+
+    Returns:
+        str: Path of the clip manifest.
+    """
+    paths = audio_file_paths(df, data_root_dir)
+    article_ids = df['ID'].astype(str)
+    news_channels = df['News Channel'].astype(str)
+    manifest_paths = clips_dir + os.sep + news_channels + os.sep + article_ids + os.sep + ARTICLE_MANIFEST
+    has_audio = paths.map(os.path.exists)
+    done = manifest_paths.map(os.path.exists)
+    pending = has_audio & ~done
+    jobs = list(zip(paths[pending], article_ids[pending], news_channels[pending]))
+    logger.info("%d articles already segmented, %d to segment.", int((has_audio & done).sum()), len(jobs))
+
+    segment = partial(metrics.run_with_metrics, segment_article_safely, clips_dir=clips_dir, **options)
+    pool = nullcontext(executor) if executor else ProcessPoolExecutor(max_workers=max_workers)
+    with metrics.profile_stage('segment'), pool as executor:
+        for entries, worker_metrics in executor.map(segment, jobs):
+            metrics.merge(worker_metrics)
+            metrics.increment('articles_segmented')
+
+    clip_manifest_path = os.path.join(clips_dir, 'clips_manifest.jsonl')
+    with open(clip_manifest_path, 'w', encoding='utf-8') as clip_manifest:
+        for manifest_path in manifest_paths[has_audio]:
+            if os.path.exists(manifest_path):
+                with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+                    clip_manifest.writelines(manifest_file)
+    return clip_manifest_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cut the downloaded news audio into training clips at silences.')
+    parser.add_argument('--input', default='./news_data.csv', help='Path of the news table.')
+    parser.add_argument('--data-dir', default='./data', help='Root data directory.')
+    parser.add_argument('--clips-dir', default='./clips', help='Root directory of the clips and their manifest.')
+    parser.add_argument('--sample-rate', type=int, default=SEGMENT_SR, help='Sample rate of the clips.')
+    parser.add_argument('--clip-format', choices=CLIP_FORMATS, default='wav', help='Audio format of the clips.')
+    parser.add_argument('--silence-db', type=float, default=SILENCE_DB,
+                        help='Silence threshold in dB below the loudest frame.')
+    parser.add_argument('--min-silence-seconds', type=float, default=MIN_SILENCE_SECONDS,
+                        help='Shortest pause that separates two clips.')
+    parser.add_argument('--min-clip-seconds', type=float, default=MIN_CLIP_SECONDS, help='Shortest clip kept.')
+    parser.add_argument('--max-clip-seconds', type=float, default=MAX_CLIP_SECONDS,
+                        help='Longer speech segments are cut into equal parts.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args)
+
+    df = read_news_table(args.input, columns=['ID', 'News Channel'])
+    clip_manifest_path = segment_articles(
+        df, args.data_dir, args.clips_dir, args.workers,
+        sr=args.sample_rate,
+        clip_format=args.clip_format,
+        silence_db=args.silence_db,
+        min_silence_seconds=args.min_silence_seconds,
+        min_clip_seconds=args.min_clip_seconds,
+        max_clip_seconds=args.max_clip_seconds,
+    )
+    logger.info("Clip manifest saved at %s", clip_manifest_path)
+    metrics.finish(args)
+
+
+if __name__ == "__main__":
+    main()
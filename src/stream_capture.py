@@ -0,0 +1,273 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import metrics
+from article_store import article_store_path, iter_articles, open_article_store
+from audio_store import (
+    add_clip,
+    add_reference,
+    clip_path,
+    dedup_stats,
+    hash_file,
+    incoming_path,
+    link_clip,
+    lookup_url,
+    open_audio_store,
+)
+from extract_news_audio import NEWS_HOUSES, capture_stream
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg errors of streams that are gone for good, e.g. a deleted clip or an expired HLS playlist
+PERMANENT_CAPTURE_ERRORS = re.compile(r'(Server returned|HTTP error) 40[0134]\b')
+
+
+def load_capture_queue(queue_path):
+    """Loads the persistent capture queue.
+
+    Args:
+        queue_path (str): Path of the JSON queue file.
+
+    Returns:
+        dict: Capture jobs keyed by destination path.
+    """
+    if not os.path.exists(queue_path):
+        return {}
+    with open(queue_path, 'r', encoding='utf-8') as queue_file:
+        return json.load(queue_file)
+
+
+def save_capture_queue(queue, queue_path):
+    """Atomically writes the capture queue to disk.
+
+    Args:
+        queue (dict): Capture jobs keyed by destination path.
+        queue_path (str): Path of the JSON queue file.
+    """
+    tmp_path = f'{queue_path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as queue_file:
+        json.dump(queue, queue_file, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, queue_path)
+
+
+def find_stream_jobs(data_root_dir, news_houses):
+    """Collects the audio URLs saved by `extract_news_audio`.
+
+    Both the article directories and the packed article store of every news house are
+    read; an article found in both is taken from its directory. HLS playlists and plain
+    MP3 URLs are both captured with ffmpeg, since no other stage fetches this audio.
+
+    Args:
+        data_root_dir (str): Root data directory.
+        news_houses (list): News houses to collect.
+
+    Returns:
+        list: (url, dest_path) tuples.
+    """
+    jobs = []
+    for news_house in news_houses:
+        articles_dir = Path(data_root_dir) / news_house / 'news_dataset_with_audio'
+        audio_dir = Path(data_root_dir) / news_house / 'downloaded_audio'
+        urls = {
+            url_path.parent.name: url_path.read_text(encoding='utf-8').strip()
+            for url_path in articles_dir.glob('*/*_audio_url.txt')
+        }
+        store_path = article_store_path(data_root_dir, news_house)
+        if os.path.exists(store_path):
+            connection = open_article_store(store_path)
+            for article_id, audio_url, _, _ in iter_articles(connection):
+                urls.setdefault(article_id, audio_url)  # Article directories take precedence
+            connection.close()
+        for article_id, url in sorted(urls.items()):
+            if url:
+                jobs.append((url, str(audio_dir / f'{article_id}.mp3')))
+    return jobs
+
+
+def is_permanent_capture_error(error):
+    """Tells whether a capture failed in a way that trying again later will not fix."""
+    return bool(error) and PERMANENT_CAPTURE_ERRORS.search(error) is not None
+
+
+def capture_with_retry(url, dest_path, timeout, retries, backoff):
+    """Captures one stream, retrying with exponential backoff unless the error is permanent.
+
+    Args:
+        url (str): URL of the stream.
+        dest_path (str): Destination path of the capture.
+        timeout (float): Seconds after which one ffmpeg attempt is killed.
+        retries (int): Number of attempts before giving up.
+        backoff (float): Seconds to wait before the first retry, doubled after every attempt.
+
+    Returns:
+        tuple: Number of attempts made and the error of the last attempt (None on success).
+    """
+    error = None
+    for attempt in range(1, retries + 1):
+        try:
+            os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+            capture_stream(url, dest_path, timeout)
+            return attempt, None
+        except subprocess.TimeoutExpired:
+            error = f'timed out after {timeout}s'
+        except subprocess.CalledProcessError as e:
+            stderr = e.stderr.decode('utf-8', errors='replace').strip() if e.stderr else ''
+            error = stderr.splitlines()[-1] if stderr else str(e)
+        except OSError as e:  # e.g. ffmpeg is not installed or the destination is not writable
+            error = str(e)
+        if is_permanent_capture_error(error):
+            return attempt, error
+        if attempt < retries:
+            time.sleep(backoff * 2 ** (attempt - 1))
+    return retries, error
+
+
+def run_capture_jobs(jobs, queue_path, workers=4, timeout=1800, retries=3, backoff=5, store_dir=None):
+    """Captures streams with a pool of ffmpeg jobs, keeping track of them in a persistent queue.
+
+    Jobs are keyed by destination, so that every article sharing a stream URL gets its
+    audio, but each URL is captured only once and copied to the other destinations.
+    New jobs, and jobs whose URL changed, are added to the queue as pending. Pending
+    and previously failed jobs are run; each job's outcome (done, failed or dead,
+    attempts, last error) is written back to the queue as soon as it finishes, so an
+    interrupted run picks up where it stopped. Dead jobs failed permanently, e.g. with
+    a 404, and are not run again until their URL changes.
+
+    With `store_dir`, captures go to the content-addressed audio store shared with
+    `audio_download`: a URL that is already stored is not captured again, a capture
+    whose content is already stored is discarded, and every destination becomes a link
+    to the unique clip. Destinations are expected at `<house>/downloaded_audio/<ID>.mp3`,
+    which gives the channel and article ID recorded in the store.
+
+    Args:
+        jobs (list): (url, dest_path) tuples to add to the queue.
+        queue_path (str): Path of the JSON queue file.
+        workers (int): Number of ffmpeg processes run at once.
+        timeout (float): Seconds after which one ffmpeg attempt is killed.
+        retries (int): Number of attempts per job and run.
+        backoff (float): Seconds to wait before the first retry.
+        store_dir (str): Directory of the content-addressed audio store, None to copy per article.
+
+    Returns:
+        dict: Number of jobs done, failed and dead, jobs served by an existing clip, bytes captured,
+            throughput in bytes per second, and the store statistics when a store is used.
+    """
+    queue = load_capture_queue(queue_path)
+    for url, dest_path in jobs:
+        if queue.get(dest_path, {}).get('url') != url:
+            queue[dest_path] = {'url': url, 'dest_path': dest_path, 'status': 'pending', 'attempts': 0, 'error': None}
+    to_run: dict = {}
+    for dest_path, job in queue.items():
+        if job['status'] not in ('done', 'dead'):
+            to_run.setdefault(job['url'], []).append(dest_path)
+    store = open_audio_store(store_dir) if store_dir else None
+
+    summary: dict = {'done': 0, 'failed': 0, 'dead': 0, 'deduplicated': 0, 'bytes': 0}
+    start = time.monotonic()
+
+    def record(url, attempts, error, sha256=None):
+        dest_paths = to_run[url]
+        if not error:
+            try:
+                for dest_path in dest_paths:
+                    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+                    if store:
+                        link_clip(store_dir, sha256, dest_path)
+                        add_reference(store, Path(dest_path).parents[1].name, Path(dest_path).stem, sha256, url)
+                    elif dest_path != dest_paths[0]:
+                        shutil.copyfile(dest_paths[0], dest_path)
+            except OSError as e:
+                error = str(e)
+        status = 'done'
+        if error:
+            status = 'dead' if is_permanent_capture_error(error) else 'failed'
+        for dest_path in dest_paths:
+            job = queue[dest_path]
+            job['attempts'] += attempts
+            job['error'] = error
+            job['status'] = status
+            summary[job['status']] += 1
+        save_capture_queue(queue, queue_path)
+        if error:
+            logger.warning("Error capturing stream %s: %s", url, error)
+        else:
+            logger.debug("Captured stream: %s", url)
+
+    capture_paths = {}
+    for url in to_run:
+        known_sha256 = lookup_url(store, url) if store else None
+        # A clip missing from disk counts as not stored and is captured again
+        if known_sha256 and os.path.exists(clip_path(store_dir, known_sha256)):
+            record(url, 0, None, known_sha256)
+            summary['deduplicated'] += len(to_run[url])
+        elif store:
+            capture_paths[url] = incoming_path(store_dir, hashlib.sha1(url.encode('utf-8')).hexdigest())
+        else:
+            capture_paths[url] = to_run[url][0]
+    save_capture_queue(queue, queue_path)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(capture_with_retry, url, capture_path, timeout, retries, backoff): url
+            for url, capture_path in capture_paths.items()
+        }
+        for future in as_completed(futures):
+            url = futures[future]
+            attempts, error = future.result()
+            sha256 = None
+            if not error:
+                summary['bytes'] += os.path.getsize(capture_paths[url])
+                if store:
+                    sha256 = hash_file(capture_paths[url])
+                    if not add_clip(store, store_dir, capture_paths[url], sha256, url):
+                        summary['deduplicated'] += len(to_run[url])
+            record(url, attempts, error, sha256)
+
+    elapsed = time.monotonic() - start
+    summary['seconds'] = elapsed
+    summary['bytes_per_second'] = summary['bytes'] / elapsed if elapsed else 0.0
+    metrics.increment('bytes_captured', summary['bytes'])
+    logger.info(
+        "Captured %d streams (%.1f MB, %.2f MB/s), %d failed, %d dead.",
+        summary['done'], summary['bytes'] / 1e6, summary['bytes_per_second'] / 1e6, summary['failed'], summary['dead'],
+    )
+    if store:
+        summary.update(dedup_stats(store))
+        store.close()
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Capture the audio streams and MP3s of the news articles with ffmpeg.')
+    parser.add_argument('--news-houses', nargs='+', default=['VOA', 'VOT'], choices=NEWS_HOUSES,
+                        help='News houses to capture.')
+    parser.add_argument('--data-dir', default='./data', help='Root data directory.')
+    parser.add_argument('--queue-path', default=None,
+                        help='Persistent capture queue, defaults to <data-dir>/stream_capture_queue.json.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of parallel ffmpeg jobs.')
+    parser.add_argument('--timeout', type=float, default=1800, help='Seconds before an ffmpeg job is killed.')
+    parser.add_argument('--retries', type=int, default=3, help='Attempts per stream.')
+    parser.add_argument('--backoff', type=float, default=5, help='Seconds before the first retry.')
+    parser.add_argument('--store-dir', default=None, help='Content-addressed audio store shared with the downloads.')
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.setup(args)
+
+    queue_path = args.queue_path or os.path.join(args.data_dir, 'stream_capture_queue.json')
+    jobs = find_stream_jobs(args.data_dir, args.news_houses)
+    with metrics.profile_stage('capture'):
+        run_capture_jobs(jobs, queue_path, args.workers, args.timeout, args.retries, args.backoff, args.store_dir)
+    metrics.finish(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Byline markers and the field they introduce; the name is the first word after the marker
+BYLINE_MARKERS = {
+    'speaker': 'གསར་འགོད་པ།',
+    'reporter': 'སྙན་ཞུ་བ།',
+    'editor': 'རྩོམ་སྒྲིག་པ།',
+    'translator': 'ཡིག་སྒྱུར་བ།',
+}
+
+BYLINE_PATTERNS = {
+    field: re.compile(re.escape(marker) + r'\s*(\S*)') for field, marker in BYLINE_MARKERS.items()
+}
+SPEAKER_PATTERN = BYLINE_PATTERNS['speaker']
+FIRST_WORD_PATTERN = re.compile(r'\S+')
+
+
+def find_byline(body_text_lines, pattern):
+    """Finds the word following a byline marker, scanning the lines lazily.
+
+    The scan stops at the first match. A marker at the end of a line takes the first
+    word of the next non-empty line, like a search over the joined text would.
+
+    Args:
+        body_text_lines (iterable): Lines of the text.
+        pattern (re.Pattern): Compiled byline pattern from `BYLINE_PATTERNS`.
+
+    Returns:
+        str: The word after the marker, or an empty string if not found.
+    """
+    waiting_for_name = False
+    for line in body_text_lines:
+        if waiting_for_name:
+            word = FIRST_WORD_PATTERN.search(line)
+            if word:
+                return word.group(0)
+            continue
+        match = pattern.search(line)
+        if match:
+            if match.group(1):
+                return match.group(1)
+            waiting_for_name = True
+    return ''
+
+
+def extract_speaker_from_text(body_text_lines):
+    """Extracts the speaker's name (the word immediately following 'གསར་འགོད་པ།') from the text.
+
+    Args:
+        body_text_lines (iterable): Lines of the text.
+
+    Returns:
+        str: Extracted speaker's name or an empty string if not found.
+    """
+    return find_byline(body_text_lines, SPEAKER_PATTERN)
+
+
+def extract_bylines(body_text_lines, fields=None):
+    """Extracts several byline fields from one text in a single pass over its lines.
+
+    Args:
+        body_text_lines (iterable): Lines of the text.
+        fields (list): Byline fields to extract, all of `BYLINE_MARKERS` when omitted.
+
+    Returns:
+        dict: The name found for every field, an empty string if not found.
+    """
+    fields = list(fields or BYLINE_PATTERNS)
+    bylines = dict.fromkeys(fields, '')
+    pending = set(fields)  # Fields not found yet
+    waiting: set = set()  # Fields whose marker ended a line, taking the next line's first word
+    for line in body_text_lines:
+        if waiting:
+            word = FIRST_WORD_PATTERN.search(line)
+            if word:
+                for field in waiting:
+                    bylines[field] = word.group(0)
+                waiting.clear()
+        for field in list(pending):
+            match = BYLINE_PATTERNS[field].search(line)
+            if match:
+                pending.discard(field)
+                if match.group(1):
+                    bylines[field] = match.group(1)
+                else:
+                    waiting.add(field)
+        if not pending and not waiting:
+            break
+    return bylines
+
+
+def _extract_bylines_chunk(texts, fields):
+    return [extract_bylines(text.splitlines() if isinstance(text, str) else text, fields) for text in texts]
+
+
+def extract_bylines_batch(texts, fields=None, max_workers=1, chunk_size=1000):
+    """Extracts byline fields from many articles.
+
+    Args:
+        texts (list): Article texts, each a string or a list of lines.
+        fields (list): Byline fields to extract, all of `BYLINE_MARKERS` when omitted.
+        max_workers (int): Number of worker processes; 1 runs in this process.
+        chunk_size (int): Number of articles sent to a worker at a time.
+
+    Returns:
+        list: One dict of bylines per article, in the same order.
+    """
+    texts = list(texts)
+    if max_workers <= 1:
+        return _extract_bylines_chunk(texts, fields)
+
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    bylines = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_bylines in executor.map(_extract_bylines_chunk, chunks, [fields] * len(chunks)):
+            bylines.extend(chunk_bylines)
+    return bylines
@@ -0,0 +1,56 @@
+import os
+from pathlib import Path
+
+from article_store import article_store_path, get_article, migrate_article_dirs, open_article_store
+from compile_news_metadata import compile_news_metadata
+from extract_news_audio import save_news_files
+
+
+def test_migrated_store_compiles_like_the_directories(tmp_path):
+    articles = [
+        (f'article{index}', {
+            'body_text': f'Line one of {index}\nLine two',
+            'audio_url': f'https://example.com/{index}.mp3',
+            'metadata': {'published_date': '2020-01-01', 'speaker': 'Tashi', 'gender': 'male'},
+        })
+        for index in range(3)
+    ]
+    articles_dir = tmp_path / 'VOT' / 'news_dataset_with_audio'
+    save_news_files(articles, articles_dir)
+    from_dirs = compile_news_metadata(str(tmp_path), ['VOT'])
+
+    store_path = article_store_path(str(tmp_path), 'VOT')
+    assert migrate_article_dirs(str(articles_dir), store_path, batch_size=2, remove_dirs=True) == 3
+    assert os.listdir(articles_dir) == []
+
+    connection = open_article_store(store_path)
+    article = get_article(connection, 'article1')
+    connection.close()
+    assert article['audio_url'] == 'https://example.com/1.mp3'
+    assert article['metadata']['speaker'] == 'Tashi'
+
+    from_store = compile_news_metadata(str(tmp_path), ['VOT'])
+    assert sorted(from_store, key=lambda row: row['ID']) == sorted(from_dirs, key=lambda row: row['ID'])
+
+    connection = open_article_store(store_path)
+    save_news_files([('article3', dict(articles[0][1]))], Path('unused'), connection)
+    connection.close()
+    assert len(compile_news_metadata(str(tmp_path), ['VOT'])) == 4
+
+
+def test_directories_next_to_a_store_are_compiled_once(tmp_path):
+    def article(index):
+        return (f'article{index}', {
+            'body_text': f'Text {index}',
+            'audio_url': f'https://example.com/{index}.mp3',
+            'metadata': {'published_date': '2020-01-01', 'speaker': 'Tashi'},
+        })
+
+    articles_dir = tmp_path / 'VOT' / 'news_dataset_with_audio'
+    save_news_files([article(0), article(1)], articles_dir)
+    migrate_article_dirs(str(articles_dir), article_store_path(str(tmp_path), 'VOT'))
+    save_news_files([article(2)], articles_dir)
+
+    rows = compile_news_metadata(str(tmp_path), ['VOT'])
+
+    assert sorted(row['ID'] for row in rows) == ['article0', 'article1', 'article2']
@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+import metrics
+import pandas as pd
+from audio_download import download_rfa_audio, load_manifest
+from http_download import create_session
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'benchmarks'))
+from local_server import serve_directory  # noqa: E402
+
+
+def test_shared_urls_are_fetched_once_and_done_ids_skipped(tmp_path):
+    (tmp_path / 'srv').mkdir()
+    (tmp_path / 'srv' / 'a.mp3').write_bytes(b'a' * 5000)
+    (tmp_path / 'srv' / 'b.mp3').write_bytes(b'b' * 3000)
+    output_dir = tmp_path / 'downloaded_audio'
+
+    with serve_directory(tmp_path / 'srv') as base_url:
+        df = pd.DataFrame({
+            'ID': ['1', '2', '3', '4', '5'],
+            'Audio URL': [f'{base_url}/a.mp3', f'{base_url}/a.mp3', f'{base_url}/b.mp3', f'{base_url}/a.mp3',
+                          f'{base_url}/gone.mp3'],
+            'News Channel': ['RFA', 'RFA', 'RFA', 'VOA', 'RFA'],
+        })
+        metrics.reset()
+        summary = download_rfa_audio(df, str(output_dir), create_session(), max_workers=2, rate_per_host=1000.0)
+        downloads = metrics.snapshot()['counters']['files_downloaded']
+        rerun = download_rfa_audio(df, str(output_dir), create_session(), max_workers=2, rate_per_host=1000.0)
+    metrics.reset()
+
+    assert downloads == 2
+    assert summary == {'done': 3, 'failed': 0, 'dead': 1, 'skipped': 0, 'deduplicated': 1}
+    assert (output_dir / '2.mp3').read_bytes() == b'a' * 5000
+    assert not (output_dir / '4.mp3').exists()
+    manifest = load_manifest(str(output_dir / 'manifest.jsonl'))
+    assert {audio_id: entry['status'] for audio_id, entry in manifest.items()} == {
+        '1': 'done', '2': 'done', '3': 'done', '5': 'dead',
+    }
+    # The dead link is not requested again
+    assert rerun == {'done': 0, 'failed': 0, 'dead': 1, 'skipped': 3, 'deduplicated': 0}
@@ -0,0 +1,53 @@
+import hashlib
+import os
+from audio_store import add_clip, add_reference, clip_path, dedup_stats, link_clip, lookup_url, open_audio_store
+
+def store_file(connection, store_dir, tmp_path, name, content, url):
+    file_path = tmp_path / name
+    file_path.write_bytes(content)
+    sha256 = hashlib.sha256(content).hexdigest()
+    return sha256, add_clip(connection, str(store_dir), str(file_path), sha256, url)
+
+def test_identical_audio_is_stored_once(tmp_path):
+    store_dir = tmp_path / 'store'
+    connection = open_audio_store(str(store_dir))
+
+    sha256, is_new = store_file(connection, store_dir, tmp_path, 'a.mp3', b'bulletin', 'https://rfa.org/a.mp3')
+    same_sha256, same_is_new = store_file(
+        connection, store_dir, tmp_path, 'b.mp3', b'bulletin', 'https://voa.org/b.mp3'
+    )
+    add_reference(connection, 'RFA', '1', sha256, 'https://rfa.org/a.mp3')
+    add_reference(connection, 'VOA', '2', same_sha256, 'https://voa.org/b.mp3')
+
+    assert is_new and not same_is_new
+    assert lookup_url(connection, 'https://voa.org/b.mp3') == sha256
+    assert dedup_stats(connection) == {
+        'articles': 2,
+        'urls': 2,
+        'unique_clips': 1,
+        'stored_bytes': len(b'bulletin'),
+        'saved_bytes': len(b'bulletin'),
+    }
+
+def test_link_clip_resolves_to_the_stored_clip(tmp_path):
+    store_dir = tmp_path / 'store'
+    connection = open_audio_store(str(store_dir))
+    sha256, _ = store_file(connection, store_dir, tmp_path, 'a.mp3', b'bulletin', 'https://rfa.org/a.mp3')
+    article_path = tmp_path / 'downloaded_audio' / '1.mp3'
+    article_path.parent.mkdir()
+
+    link_clip(str(store_dir), sha256, str(article_path))
+
+    assert article_path.read_bytes() == b'bulletin'
+    assert os.path.realpath(article_path).endswith(f'{sha256}.mp3')
+
+def test_deleted_clip_is_stored_again(tmp_path):
+    store_dir = tmp_path / 'store'
+    connection = open_audio_store(str(store_dir))
+    sha256, _ = store_file(connection, store_dir, tmp_path, 'a.mp3', b'bulletin', 'https://rfa.org/a.mp3')
+    os.remove(clip_path(str(store_dir), sha256))
+
+    _, is_new = store_file(connection, store_dir, tmp_path, 'a.mp3', b'bulletin', 'https://rfa.org/a.mp3')
+
+    assert is_new
+    assert os.path.exists(clip_path(str(store_dir), sha256))
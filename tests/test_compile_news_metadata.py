@@ -0,0 +1,44 @@
+import os
+import shutil
+
+import compile_news_metadata
+from compile_news_metadata import compile_news_metadata as compile_full
+from compile_news_metadata import compile_news_metadata_incremental
+from extract_news_audio import save_news_files
+
+
+def test_incremental_compile_only_rereads_changed_articles(tmp_path, monkeypatch):
+    articles_dir = tmp_path / 'VOT' / 'news_dataset_with_audio'
+    save_news_files([
+        (f'article{index}', {
+            'body_text': f'Text {index}',
+            'audio_url': f'https://example.com/{index}.mp3',
+            'metadata': {'published_date': '2020-01-01', 'speaker': 'Tashi'},
+        })
+        for index in range(3)
+    ], articles_dir)
+    index_path = str(tmp_path / 'index.sqlite')
+    compiled = []
+    compile_article_row = compile_news_metadata.compile_article_row
+
+    def counting_compile(channel, article_dir):
+        compiled.append(article_dir)
+        return compile_article_row(channel, article_dir)
+
+    monkeypatch.setattr(compile_news_metadata, 'compile_article_row', counting_compile)
+
+    compile_news_metadata_incremental(str(tmp_path), ['VOT'], index_path)
+    assert len(compiled) == 3
+
+    compiled.clear()
+    edited = articles_dir / 'article0' / 'news_text.txt'
+    edited.write_text('Edited text, longer than before', encoding='utf-8')
+    os.utime(edited, ns=(1, os.stat(edited).st_mtime_ns + 10 ** 9))
+    shutil.rmtree(articles_dir / 'article1')
+    rows = compile_news_metadata_incremental(str(tmp_path), ['VOT'], index_path)
+
+    assert compiled == [str(articles_dir / 'article0')]
+    by_id = sorted(compile_full(str(tmp_path), ['VOT']), key=lambda row: row['ID'])
+    assert sorted(rows, key=lambda row: row['ID']) == by_id
+    assert [row['ID'] for row in by_id] == ['article0', 'article2']
+    assert by_id[0]['Audio Text'] == 'Edited text, longer than before'
@@ -1,5 +1,9 @@
 import json
-from extract_news_audio import has_news_audio
+from pathlib import Path
+import extract_news_audio
+from extract_news_audio import has_news_audio, iter_news_items
+
+TEST_DATASET_PATH = Path(__file__).parent / 'test_dataset.json'
 
 def read_json_file(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -7,7 +11,7 @@ def read_json_file(file_path):
 
 def test_has_news_audio():
     # Load news data from a JSON file
-    news_data = read_json_file(f'./test_dataset.json')
+    news_data = read_json_file(TEST_DATASET_PATH)
     expected_results = {
         "1": True,
         "2": False,
@@ -21,6 +25,14 @@ def test_has_news_audio():
         
         assert result == expected_result, f"Expected {expected_result} but got {result} for article {article_id}"
 
+def test_iter_news_items_streams_large_dumps(monkeypatch):
+    loaded = list(iter_news_items(TEST_DATASET_PATH))
+    monkeypatch.setattr(extract_news_audio, 'STREAMING_MIN_BYTES', 0)
+    streamed = list(iter_news_items(TEST_DATASET_PATH))
+
+    assert [news_id for news_id, _ in loaded] == ['1', '2', '3']
+    assert streamed == loaded
+
 if __name__ == "__main__":
     test_has_news_audio()
     print("All tests checked!")
\ No newline at end of file
@@ -0,0 +1,55 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+from feature_cache import CACHE_SR, evict, load_audio, load_feature, open_feature_cache
+
+
+def test_features_are_computed_once_and_evicted(tmp_path):
+    audio_file = str(tmp_path / 'clip.wav')
+    sf.write(audio_file, np.sin(np.arange(16000) / 10).astype(np.float32), 16000)
+    cache_dir = str(tmp_path / 'cache')
+    calls = []
+
+    def energy(samples, sr):
+        calls.append(sr)
+        return np.sqrt(np.mean(np.square(samples), keepdims=True))
+
+    first = load_feature(cache_dir, audio_file, 'energy', energy)
+    second = load_feature(cache_dir, audio_file, 'energy', energy)
+
+    assert calls == [CACHE_SR]
+    assert isinstance(second, np.memmap)
+    assert np.allclose(first, second)
+    assert len(load_audio(cache_dir, audio_file)) == CACHE_SR
+
+    # Storing a feature again replaces its size instead of adding to it
+    os.remove(next((tmp_path / 'cache').glob('*/*/energy.npy')))
+    load_feature(cache_dir, audio_file, 'energy', energy)
+    connection = open_feature_cache(cache_dir)
+    indexed = connection.execute('SELECT SUM(bytes) FROM entries').fetchone()[0]
+    connection.close()
+    assert indexed == sum(path.stat().st_size for path in (tmp_path / 'cache').glob('*/*/*.npy'))
+
+    assert evict(cache_dir, max_bytes=0) > 0
+    assert not list((tmp_path / 'cache').glob('*/*/audio.npy'))
+
+
+def test_concurrent_writers_do_not_clobber_each_other(tmp_path):
+    audio_file = str(tmp_path / 'clip.wav')
+    sf.write(audio_file, np.sin(np.arange(16000) / 10).astype(np.float32), 16000)
+    cache_dir = str(tmp_path / 'cache')
+    load_audio(cache_dir, audio_file)
+    barrier = threading.Barrier(4)
+
+    def energy(samples, sr):
+        barrier.wait()  # Every worker misses the cache and stores the feature at the same time
+        return np.full(4_000_000, np.sqrt(np.mean(np.square(samples))))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        features = list(executor.map(lambda _: load_feature(cache_dir, audio_file, 'energy', energy), range(4)))
+
+    assert all(np.array_equal(feature, features[0]) for feature in features)
+    assert not list((tmp_path / 'cache').glob('*/*/*.part'))
@@ -0,0 +1,118 @@
+import hashlib
+import io
+import os
+import sys
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+from http_download import IncompleteDownloadError, create_session, download_file
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'benchmarks'))
+from local_server import RangeRequestHandler, serve_directory  # noqa: E402
+
+AUDIO = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def served(tmp_path):
+    (tmp_path / 'srv').mkdir()
+    (tmp_path / 'srv' / 'clip.mp3').write_bytes(AUDIO)
+    with serve_directory(tmp_path / 'srv') as base_url:
+        yield f'{base_url}/clip.mp3'
+
+
+def test_partial_download_is_resumed(tmp_path, served):
+    dest_path = str(tmp_path / 'clip.mp3')
+    with open(f'{dest_path}.part', 'wb') as part_file:
+        part_file.write(AUDIO[:1000])
+
+    result = download_file(create_session(), served, dest_path)
+
+    assert result['resumed'] and result['bytes'] == len(AUDIO)
+    assert result['sha256'] == hashlib.sha256(AUDIO).hexdigest()
+    assert Path(dest_path).read_bytes() == AUDIO
+    assert not os.path.exists(f'{dest_path}.part')
+
+
+def test_complete_part_file_is_renamed_on_416(tmp_path, served):
+    dest_path = str(tmp_path / 'clip.mp3')
+    with open(f'{dest_path}.part', 'wb') as part_file:
+        part_file.write(AUDIO)
+
+    result = download_file(create_session(), served, dest_path)
+
+    assert result == {'bytes': len(AUDIO), 'sha256': hashlib.sha256(AUDIO).hexdigest(), 'resumed': True,
+                      'skipped': False}
+    assert Path(dest_path).read_bytes() == AUDIO
+
+
+def test_failed_download_leaves_no_file(tmp_path, served):
+    dest_path = str(tmp_path / 'missing.mp3')
+
+    with pytest.raises(requests.HTTPError):
+        download_file(create_session(), served.replace('clip.mp3', 'missing.mp3'), dest_path)
+
+    assert not os.path.exists(dest_path)
+
+
+class ShortRangeHandler(RangeRequestHandler):
+    """Answers range requests with at most 1000 bytes, like servers that cap partial responses."""
+
+    def send_head(self):
+        range_header = self.headers.get('Range')
+        if not range_header:
+            return super().send_head()
+        with open(self.translate_path(self.path), 'rb') as served_file:
+            data = served_file.read()
+        start = int(range_header[len('bytes='):].rstrip('-'))
+        body = data[start:start + 1000]
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {start}-{start + len(body) - 1}/{len(data)}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+
+def test_short_responses_raise_and_are_resumed(tmp_path):
+    (tmp_path / 'srv').mkdir()
+    (tmp_path / 'srv' / 'clip.mp3').write_bytes(AUDIO)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(ShortRangeHandler, directory=str(tmp_path / 'srv')))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/clip.mp3'
+    dest_path = str(tmp_path / 'clip.mp3')
+    with open(f'{dest_path}.part', 'wb') as part_file:
+        part_file.write(AUDIO[:100])
+
+    # Every attempt adds 1000 bytes to the partial file until the announced size is reached
+    result = None
+    try:
+        for attempt in range(1, 20):
+            try:
+                result = download_file(create_session(), url, dest_path)
+                break
+            except IncompleteDownloadError:
+                assert not os.path.exists(dest_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert attempt == 11
+    assert result['sha256'] == hashlib.sha256(AUDIO).hexdigest()
+
+
+def test_existing_files_are_checked_with_head(tmp_path, served):
+    complete_path = tmp_path / 'complete.mp3'
+    complete_path.write_bytes(AUDIO)
+    wrong_size_path = tmp_path / 'wrong_size.mp3'
+    wrong_size_path.write_bytes(AUDIO[:10])
+
+    skipped = download_file(create_session(), served, str(complete_path), skip_existing=True)
+    refetched = download_file(create_session(), served, str(wrong_size_path), skip_existing=True)
+
+    assert skipped['skipped'] and skipped['sha256'] == hashlib.sha256(AUDIO).hexdigest()
+    assert not refetched['skipped']
+    assert wrong_size_path.read_bytes() == AUDIO
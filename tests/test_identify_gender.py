@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from identify_gender import (
+    FEMALE_PITCH_THRESHOLD,
+    TARGET_SR,
+    classify_gender,
+    classify_gender_streaming,
+    iter_audio_blocks,
+    select_pitches,
+)
+
+def test_select_pitches_picks_strongest_bin_per_frame():
+    pitches = np.array([
+        [100.0, 0.0, 220.0],
+        [200.0, 0.0, 110.0],
+    ])
+    magnitudes = np.array([
+        [0.1, 0.5, 0.9],
+        [0.8, 0.2, 0.3],
+    ])
+
+    # The second frame is unvoiced and is dropped
+    assert select_pitches(pitches, magnitudes).tolist() == [200.0, 220.0]
+
+def test_streaming_and_whole_file_classification_agree(tmp_path):
+    sr = 16000
+    t = np.arange(6 * sr) / sr
+    # piptrack only searches 150 Hz and up, so the "male" tone sits just above that
+    for pitch in [155, 250]:
+        audio_file = str(tmp_path / f'{pitch}.wav')
+        sf.write(audio_file, (0.5 * np.sin(2 * np.pi * pitch * t)).astype(np.float32), sr)
+
+        blocks = list(iter_audio_blocks(audio_file, block_seconds=2))
+        assert len(blocks) == 3
+        assert sum(block.size for block in blocks) == pytest.approx(6 * TARGET_SR, abs=TARGET_SR // 100)
+
+        label = classify_gender(audio_file)
+        assert label == ('Female' if pitch > FEMALE_PITCH_THRESHOLD else 'Male')
+        assert classify_gender_streaming(audio_file, block_seconds=2) == label
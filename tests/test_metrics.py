@@ -0,0 +1,16 @@
+import metrics
+
+def test_worker_metrics_are_merged_and_exported():
+    metrics.reset()
+    _, worker_metrics = metrics.run_with_metrics(metrics.observe, 'download_seconds', 0.2)
+    metrics.reset()
+    metrics.increment('files_parsed', 2)
+    metrics.merge(worker_metrics)
+
+    exported = metrics.to_prometheus(metrics.snapshot())
+
+    assert 'files_parsed_total 2' in exported
+    assert 'download_seconds_bucket{le="0.1"} 0' in exported
+    assert 'download_seconds_bucket{le="0.25"} 1' in exported
+    assert 'download_seconds_count 1' in exported
+    metrics.reset()
@@ -0,0 +1,29 @@
+import struct
+from mp3_duration import is_constant_bitrate, parse_frame_header, probe_mp3_duration
+
+FRAME_HEADER = b'\xff\xfb\x90\x00'  # MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo
+FRAME_LENGTH = 417
+
+def make_frame(payload=b''):
+    frame = FRAME_HEADER + payload
+    return frame + b'\x00' * (FRAME_LENGTH - len(frame))
+
+def test_duration_from_xing_header(tmp_path):
+    xing = b'\x00' * 32 + b'Xing' + struct.pack('>II', 1, 1000)
+    mp3_path = tmp_path / 'vbr.mp3'
+    mp3_path.write_bytes(make_frame(xing) + make_frame() * 10)
+
+    assert probe_mp3_duration(str(mp3_path)) == 1000 * 1152 / 44100
+
+def test_duration_of_constant_bitrate_file(tmp_path):
+    id3_tag = b'ID3\x04\x00\x00\x00\x00\x00\x0a' + b'\x00' * 10
+    mp3_path = tmp_path / 'cbr.mp3'
+    mp3_path.write_bytes(id3_tag + make_frame() * 100)
+
+    assert abs(probe_mp3_duration(str(mp3_path)) - 100 * FRAME_LENGTH * 8 / 128000) < 1e-9
+
+def test_single_frame_is_not_taken_as_constant_bitrate():
+    frame = parse_frame_header(FRAME_HEADER)
+
+    assert not is_constant_bitrate(make_frame(), 0, frame)
+    assert is_constant_bitrate(make_frame() * 2, 0, frame)
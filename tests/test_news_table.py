@@ -0,0 +1,42 @@
+import pandas as pd
+from news_table import audio_file_paths, duration_to_seconds, read_news_table, write_news_table
+
+def test_duration_to_seconds():
+    durations = pd.Series(['00:01:05', 'Duration not found', '12.5'])
+    seconds = duration_to_seconds(durations)
+
+    assert seconds[0] == 65.0
+    assert pd.isna(seconds[1])
+    assert seconds[2] == 12.5
+
+def test_parquet_round_trip(tmp_path):
+    df = pd.DataFrame({
+        'ID': ['1', '2', '3'],
+        'Audio Text': ['a', 'b', 'c'],
+        'News Channel': ['RFA', 'VOA', 'VOT'],
+        'Publishing Year': ['2024-08-01', 'not a date', 'March 3, 2021'],
+    })
+    table_path = str(tmp_path / 'news_data.parquet')
+    write_news_table(df, table_path)
+
+    result = read_news_table(table_path, columns=['ID', 'Publishing Year'])
+
+    assert list(result.columns) == ['ID', 'Publishing Year']
+    assert result['Publishing Year'][0] == pd.Timestamp('2024-08-01')
+    assert pd.isna(result['Publishing Year'][1])
+    assert result['Publishing Year'][2] == pd.Timestamp('2021-03-03')
+
+def test_audio_file_paths_resolve_store_links(tmp_path):
+    audio_dir = tmp_path / 'RFA' / 'downloaded_audio'
+    audio_dir.mkdir(parents=True)
+    clip = tmp_path / 'clip.mp3'
+    clip.write_bytes(b'audio')
+    (audio_dir / '1.mp3').symlink_to(clip)
+    (audio_dir / '2.mp3').symlink_to(clip)
+    df = pd.DataFrame({'ID': [1, 2, 3], 'News Channel': ['RFA', 'RFA', 'VOA']})
+
+    paths = audio_file_paths(df, str(tmp_path))
+    resolved = audio_file_paths(df, str(tmp_path), resolve_links=True)
+
+    assert paths[2] == str(tmp_path / 'VOA' / 'downloaded_audio' / '3.mp3')
+    assert resolved[0] == resolved[1] == str(clip.resolve())
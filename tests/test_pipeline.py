@@ -0,0 +1,54 @@
+import argparse
+import os
+
+import pipeline
+from pipeline import Stage, plan_stages, run_stages, stamp_path
+
+
+def test_only_stale_stages_are_planned(tmp_path):
+    source, table, report = (str(tmp_path / name) for name in ['source.json', 'table.csv', 'report.csv'])
+    stamp_dir = str(tmp_path)
+    stages = {
+        'build': Stage('build', [], [source], [table], None),
+        'report': Stage('report', ['build'], [table], [report], None),
+    }
+    for path in [source, table, report, stamp_path(stamp_dir, 'build'), stamp_path(stamp_dir, 'report')]:
+        with open(path, 'w') as file:
+            file.write('x')
+        os.utime(path, ns=(1, 10 ** 18) if path == source else (1, 2 * 10 ** 18))
+
+    assert plan_stages(stages, ['report'], stamp_dir) == []
+    assert plan_stages(stages, ['report'], stamp_dir, force=['report']) == ['report']
+
+    os.utime(source, ns=(1, 3 * 10 ** 18))
+    assert plan_stages(stages, ['report'], stamp_dir) == ['build', 'report']
+
+    os.utime(source, ns=(1, 10 ** 18))
+    os.remove(report)
+    assert plan_stages(stages, ['build'], stamp_dir) == []
+    assert plan_stages(stages, ['report'], stamp_dir) == ['report']
+
+def test_stages_with_failures_are_not_stamped(tmp_path, monkeypatch):
+    ran = []
+
+    def stage(name, deps, complete=True):
+        def run():
+            ran.append(name)
+            return complete
+        return Stage(name, deps, [], [], run)
+
+    stages = {
+        'download': stage('download', [], complete=False),
+        'capture': stage('capture', []),
+        'duration': stage('duration', ['download', 'capture']),
+    }
+    monkeypatch.setattr(pipeline, 'build_stages', lambda args, context: stages)
+    args = argparse.Namespace(work_dir=str(tmp_path), targets=['duration'], force=[], dry_run=False, workers=1,
+                              download_workers=1)
+    stamp_dir = str(tmp_path / '.pipeline')
+
+    assert run_stages(args) == ['download', 'capture', 'duration']
+    assert os.path.exists(stamp_path(stamp_dir, 'capture'))
+    assert not os.path.exists(stamp_path(stamp_dir, 'download'))
+    assert not os.path.exists(stamp_path(stamp_dir, 'duration'))
+    assert plan_stages(stages, ['duration'], stamp_dir) == ['download', 'duration']
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+from http_download import create_session
+from rate_limit import AdaptiveConcurrency, HostRateLimiter, fetch_with_retry, is_retryable, parse_retry_after
+
+sys.path.insert(0, str(Path(__file__).parents[1] / 'benchmarks'))
+from local_server import serve_directory  # noqa: E402
+
+
+def test_retry_after_and_adaptive_concurrency():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('soon') is None
+
+    concurrency = AdaptiveConcurrency(8, increase_after=2)
+    concurrency.acquire()
+    concurrency.release(throttled=True)
+    assert concurrency.limit == 4
+    for _ in range(2):
+        concurrency.acquire()
+        concurrency.release()
+    assert concurrency.limit == 5
+
+
+def test_only_transient_errors_are_retryable():
+    def http_error(status_code):
+        response = requests.Response()
+        response.status_code = status_code
+        return requests.HTTPError(response=response)
+
+    assert is_retryable(http_error(429))
+    assert is_retryable(requests.exceptions.ChunkedEncodingError())
+    assert not is_retryable(http_error(404))
+    assert not is_retryable(requests.exceptions.InvalidURL())
+
+
+def test_permanent_errors_leave_the_concurrency_limit_alone(tmp_path):
+    concurrency = AdaptiveConcurrency(4, increase_after=1)
+    concurrency.limit = 2
+    rate_limiter = HostRateLimiter(1000.0, burst=4)
+    dest_path = str(tmp_path / 'missing.mp3')
+    (tmp_path / 'srv').mkdir()
+
+    with serve_directory(tmp_path / 'srv') as base_url:
+        with pytest.raises(requests.HTTPError):
+            fetch_with_retry(create_session(), f'{base_url}/missing.mp3', dest_path, rate_limiter, concurrency)
+        with pytest.raises(ValueError):
+            fetch_with_retry(create_session(), f'{base_url}/missing.mp3', dest_path, rate_limiter, concurrency,
+                             retries=0)
+
+    assert concurrency.limit == 2 and concurrency.successes == 0 and concurrency.in_flight == 0
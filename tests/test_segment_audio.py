@@ -0,0 +1,49 @@
+import json
+
+import numpy as np
+import pandas as pd
+import soundfile as sf
+from segment_audio import find_segments, segment_articles
+
+SR = 16000
+
+
+def tone(seconds, frequency=220.0):
+    t = np.arange(int(seconds * SR)) / SR
+    return (0.5 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SR), dtype=np.float32)
+
+
+def test_find_segments_splits_at_pauses():
+    samples = np.concatenate([silence(0.5), tone(2), silence(1), tone(3), silence(0.1), tone(1.5), silence(0.5)])
+    segments = find_segments(samples, SR, pad_seconds=0)
+
+    assert len(segments) == 2
+    assert np.allclose(segments / SR, [[0.5, 2.5], [3.5, 8.1]], atol=0.05)
+
+    long_segments = find_segments(tone(25), SR, max_clip_seconds=10, pad_seconds=0)
+    assert len(long_segments) == 3
+    assert long_segments[-1][1] == 25 * SR
+
+
+def test_segment_articles_resumes(tmp_path):
+    audio_dir = tmp_path / 'data' / 'VOA' / 'downloaded_audio'
+    audio_dir.mkdir(parents=True)
+    sf.write(audio_dir / 'a1.wav', np.concatenate([tone(2), silence(1), tone(2)]), SR)
+    (audio_dir / 'a1.wav').rename(audio_dir / 'a1.mp3')
+    df = pd.DataFrame({'ID': ['a1', 'a2'], 'News Channel': ['VOA', 'VOA']})
+    clips_dir = str(tmp_path / 'clips')
+
+    manifest_path = segment_articles(df, str(tmp_path / 'data'), clips_dir, max_workers=1)
+    with open(manifest_path, encoding='utf-8') as manifest_file:
+        entries = [json.loads(line) for line in manifest_file]
+    assert [(entry['id'], entry['clip']) for entry in entries] == [('a1', 0), ('a1', 1)]
+    assert sf.info(entries[1]['path']).samplerate == SR
+
+    first_clip = tmp_path / 'clips' / 'VOA' / 'a1' / 'a1_0000.wav'
+    first_clip.unlink()
+    segment_articles(df, str(tmp_path / 'data'), clips_dir, max_workers=1)
+    assert not first_clip.exists()
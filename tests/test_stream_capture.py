@@ -0,0 +1,119 @@
+import hashlib
+import os
+import subprocess
+
+import stream_capture
+from audio_store import clip_path
+from extract_news_audio import save_news_files
+from stream_capture import find_stream_jobs, load_capture_queue, run_capture_jobs
+
+
+def test_capture_queue_records_failures_and_resumes(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / 'queue.json')
+    jobs = [('https://example.com/live.m3u8', str(tmp_path / 'audio' / f'{article_id}.mp3')) for article_id in 'ab']
+    statuses = []
+
+    def missing_ffmpeg(url, dest_path, timeout=None):
+        statuses.append(load_capture_queue(queue_path)[dest_path]['status'])
+        raise FileNotFoundError('ffmpeg')
+
+    monkeypatch.setattr(stream_capture, 'capture_stream', missing_ffmpeg)
+    summary = run_capture_jobs(jobs, queue_path, workers=1, retries=1)
+    assert statuses == ['pending']  # Both articles share one capture
+    assert summary['failed'] == 2
+    assert {job['status'] for job in load_capture_queue(queue_path).values()} == {'failed'}
+
+    def capture(url, dest_path, timeout=None):
+        with open(dest_path, 'wb') as audio:
+            audio.write(b'audio')
+
+    monkeypatch.setattr(stream_capture, 'capture_stream', capture)
+    summary = run_capture_jobs(jobs, queue_path, workers=1, retries=1)
+    queue = load_capture_queue(queue_path)
+    assert summary['done'] == 2
+    assert sorted(queue) == sorted(dest_path for _, dest_path in jobs)
+    assert all(job['status'] == 'done' and job['attempts'] == 2 for job in queue.values())
+
+
+def test_shared_stream_url_is_captured_once(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / 'queue.json')
+    jobs = [('https://example.com/live.m3u8', str(tmp_path / 'VOA' / f'{article_id}.mp3')) for article_id in 'ab']
+    jobs.append(('https://example.com/other.m3u8', str(tmp_path / 'VOT' / 'c.mp3')))
+    captured = []
+
+    def capture(url, dest_path, timeout=None):
+        captured.append(url)
+        with open(dest_path, 'wb') as audio:
+            audio.write(url.encode())
+
+    monkeypatch.setattr(stream_capture, 'capture_stream', capture)
+    summary = run_capture_jobs(jobs, queue_path, workers=2, retries=1)
+
+    assert sorted(captured) == ['https://example.com/live.m3u8', 'https://example.com/other.m3u8']
+    assert summary['done'] == 3
+    assert summary['bytes'] == len('https://example.com/live.m3u8') + len('https://example.com/other.m3u8')
+    assert (tmp_path / 'VOA' / 'b.mp3').read_bytes() == b'https://example.com/live.m3u8'
+
+
+def test_plain_mp3_urls_are_captured_too(tmp_path):
+    save_news_files([
+        ('hls', {'audio_url': 'https://example.com/live.m3u8', 'body_text': '', 'metadata': {}}),
+        ('mp3', {'audio_url': 'https://example.com/clip.mp3', 'body_text': '', 'metadata': {}}),
+    ], tmp_path / 'VOA' / 'news_dataset_with_audio')
+
+    jobs = find_stream_jobs(str(tmp_path), ['VOA'])
+
+    audio_dir = tmp_path / 'VOA' / 'downloaded_audio'
+    assert jobs == [
+        ('https://example.com/live.m3u8', str(audio_dir / 'hls.mp3')),
+        ('https://example.com/clip.mp3', str(audio_dir / 'mp3.mp3')),
+    ]
+
+
+def test_captures_go_through_the_audio_store(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / 'queue.json')
+    store_dir = str(tmp_path / 'store')
+    jobs = [
+        ('https://example.com/live.m3u8', str(tmp_path / 'VOA' / 'downloaded_audio' / '1.mp3')),
+        ('https://example.com/live.m3u8', str(tmp_path / 'VOT' / 'downloaded_audio' / '2.mp3')),
+        ('https://example.com/copy.mp3', str(tmp_path / 'VOT' / 'downloaded_audio' / '3.mp3')),
+    ]
+    captured = []
+
+    def capture(url, dest_path, timeout=None):
+        captured.append(url)
+        with open(dest_path, 'wb') as audio:
+            audio.write(b'bulletin')
+
+    monkeypatch.setattr(stream_capture, 'capture_stream', capture)
+    summary = run_capture_jobs(jobs, queue_path, workers=1, retries=1, store_dir=store_dir)
+
+    assert sorted(captured) == ['https://example.com/copy.mp3', 'https://example.com/live.m3u8']
+    assert summary['done'] == 3 and summary['unique_clips'] == 1 and summary['articles'] == 3
+    sha256 = hashlib.sha256(b'bulletin').hexdigest()
+    assert {os.path.realpath(dest_path) for _, dest_path in jobs} == {os.path.realpath(clip_path(store_dir, sha256))}
+
+    # A new article with a stored URL is linked without capturing
+    captured.clear()
+    new_job = ('https://example.com/live.m3u8', str(tmp_path / 'VOA' / 'downloaded_audio' / '4.mp3'))
+    summary = run_capture_jobs(jobs + [new_job], queue_path, workers=1, retries=1, store_dir=store_dir)
+    assert captured == [] and summary['deduplicated'] == 1 and summary['articles'] == 4
+
+
+def test_dead_streams_are_not_retried(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / 'queue.json')
+    jobs = [('https://example.com/expired.m3u8', str(tmp_path / 'audio' / 'a.mp3'))]
+    calls = []
+
+    def expired(url, dest_path, timeout=None):
+        calls.append(url)
+        raise subprocess.CalledProcessError(8, 'ffmpeg', stderr=f'{url}: Server returned 404 Not Found\n'.encode())
+
+    monkeypatch.setattr(stream_capture, 'capture_stream', expired)
+    summary = run_capture_jobs(jobs, queue_path, workers=1, retries=3, backoff=0)
+    rerun = run_capture_jobs(jobs, queue_path, workers=1, retries=3, backoff=0)
+
+    assert len(calls) == 1
+    assert summary['dead'] == 1 and summary['failed'] == 0
+    assert rerun['dead'] == 0 and rerun['failed'] == 0
+    assert load_capture_queue(queue_path)[jobs[0][1]]['status'] == 'dead'
@@ -0,0 +1,26 @@
+from text_analysis import extract_bylines, extract_bylines_batch, extract_speaker_from_text
+
+def test_extract_speaker_from_text():
+    lines = ['བོད་ཀྱི་གསར་འགྱུར།', 'གསར་འགོད་པ། བཀྲ་ཤིས། ཡིན།', 'གསར་འགོད་པ། སྒྲོལ་མ།']
+
+    assert extract_speaker_from_text(lines) == 'བཀྲ་ཤིས།'
+    assert extract_speaker_from_text(['no byline here']) == ''
+
+def test_extract_speaker_from_next_line():
+    lines = ['གསར་འགོད་པ།\n', '\n', 'བཀྲ་ཤིས། ཡིན།\n']
+
+    assert extract_speaker_from_text(lines) == 'བཀྲ་ཤིས།'
+
+def test_extract_bylines():
+    lines = ['སྙན་ཞུ་བ། པདྨ།', 'གསར་འགོད་པ། བཀྲ་ཤིས།']
+
+    bylines = extract_bylines(lines, ['speaker', 'reporter', 'editor'])
+
+    assert bylines == {'speaker': 'བཀྲ་ཤིས།', 'reporter': 'པདྨ།', 'editor': ''}
+
+def test_extract_bylines_batch():
+    texts = ['གསར་འགོད་པ། བཀྲ་ཤིས།', ['nothing'], 'a\nགསར་འགོད་པ། སྒྲོལ་མ།']
+
+    bylines = extract_bylines_batch(texts, ['speaker'])
+
+    assert [article['speaker'] for article in bylines] == ['བཀྲ་ཤིས།', '', 'སྒྲོལ་མ།']